@@ -2,25 +2,57 @@ import os
 import config
 import blockchain
 from blockchain.util import encode_as_str
+from blockchain.utxo import UTXOView, AncestorView
 import transaction, persistent
+from BTrees.IOBTree import IOBTree
+from BTrees.OOBTree import OOBTree, OOTreeSet
 
 class Blockchain(persistent.Persistent):
 
+    #: Chain ends further apart than this (in blocks) are compared with ancestor queries rather than a UTXO overlay
+    MAX_UTXO_VIEW_DISTANCE = 16
+
     def __init__(self):
         """ Create a new Blockchain object; we store 1 globally in the database.
 
+        All indexes are BTrees, so ZODB stores them as many small buckets: a commit only writes
+        the buckets an added block touched, and loading the chain only loads the buckets read.
+        Stored lists are never mutated in place, always replaced, so the owning bucket is saved.
+
         Attributes:
-            chain (:obj:`dict` of (int to (:obj:`list` of str))): Maps integer chain heights to list of block hashes at that height in the DB (as strings).
-            blocks (:obj:`dict` of (str to (:obj:`Block`))): Maps block hashes to their corresponding Block objects in the DB.
-            blocks_spending_input (:obj:`dict` of (str to (:obj:`list` of str))): Maps input references as strings to all blocks in the DB that spent them as list of their hashes.
-            blocks_containing_tx (:obj:`dict` of (str to (:obj:`list` of str))): Maps transaction hashes to all blocks in the DB that spent them as list of their hashes.
-            all_transactions (:obj:`dict` of (str to :obj:`Transaction`)): Maps transaction hashes to their corresponding Transaction objects.
-        """
-        self.chain = {}
-        self.blocks = {}
-        self.blocks_spending_input = {}
-        self.blocks_containing_tx = {}
-        self.all_transactions = {}
+            chain (:obj:`IOBTree` of (int to (:obj:`list` of str))): Maps integer chain heights to list of block hashes at that height in the DB (as strings).
+            blocks (:obj:`OOBTree` of (str to (:obj:`Block`))): Maps block hashes to their corresponding Block objects in the DB.
+            blocks_spending_input (:obj:`OOBTree` of (str to (:obj:`list` of str))): Maps input references as strings to all blocks in the DB that spent them as list of their hashes.
+            blocks_containing_tx (:obj:`OOBTree` of (str to (:obj:`list` of str))): Maps transaction hashes to all blocks in the DB that spent them as list of their hashes.
+            all_transactions (:obj:`OOBTree` of (str to :obj:`Transaction`)): Maps transaction hashes to their corresponding Transaction objects.
+            utxo_tip (str): Hash of the block whose UTXO state is materialized in unspent_outputs and included_txs (the end of active_chain; None if empty).
+            unspent_outputs (:obj:`OOTreeSet` of str): Input references of all outputs left unspent on the chain ending with utxo_tip.
+            included_txs (:obj:`OOTreeSet` of str): Hashes of all transactions included on the chain ending with utxo_tip.
+            skip_pointers (:obj:`OOBTree` of (str to (:obj:`list` of str))): Maps block hashes to the hashes of their 1st, 2nd, 4th, ... 2^i-th ancestors.
+            total_weights (:obj:`OOBTree` of (str to int)): Maps block hashes to their total accumulated weight in the blockchain.
+            heaviest_tip (str): Hash of the block with the maximum total weight (None if empty).
+            block_count (int): Number of blocks in the blockchain (len() of a BTree walks all its buckets).
+            tips (:obj:`OOBTree` of (str to tuple)): Maps hashes of all blocks without children (chain tips) to their key in tips_by_weight.
+            tips_by_weight (:obj:`OOTreeSet` of tuple): (-total weight, height, -insertion order, hash) keys of all tips, heaviest first.
+            verdicts (:obj:`OOBTree` of (str to (bool, str))): Maps block hashes to the is_valid() result recorded when they were added.
+            active_chain (:obj:`IOBTree` of (int to str)): Maps heights to the hashes of the blocks on the best chain (the one ending with heaviest_tip).
+        """
+        self.chain = IOBTree()
+        self.blocks = OOBTree()
+        self.blocks_spending_input = OOBTree()
+        self.blocks_containing_tx = OOBTree()
+        self.all_transactions = OOBTree()
+        self.utxo_tip = None
+        self.unspent_outputs = OOTreeSet()
+        self.included_txs = OOTreeSet()
+        self.skip_pointers = OOBTree()
+        self.total_weights = OOBTree()
+        self.heaviest_tip = None
+        self.block_count = 0
+        self.tips = OOBTree()
+        self.tips_by_weight = OOTreeSet()
+        self.verdicts = OOBTree()
+        self.active_chain = IOBTree()
 
     def add_block(self, block, save=True):
         """ Adds a block to the blockchain; the block must be valid according to all block rules.
@@ -34,38 +66,119 @@ class Blockchain(persistent.Persistent):
         """
         if block.hash in self.blocks:
             return False
-        if not block.is_valid()[0]:
+        verdict = block.is_valid()
+        if not verdict[0]:
             return False
-        if not block.height in self.chain:
-            self.chain[block.height] = []
-        if not block.hash in self.chain[block.height]:
-            # add newer blocks to front so they show up first in UI
-            self.chain[block.height] = [block.hash] + self.chain[block.height]
-        if not block.hash in self.blocks:
-            self.blocks[block.hash] = block
-        for tx in block.transactions:
-            self.all_transactions[tx.hash] = tx
-            if not tx.hash in self.blocks_containing_tx:
-                self.blocks_containing_tx[tx.hash] = []
-            self.blocks_containing_tx[tx.hash].append(block.hash)
-            for input_ref in tx.input_refs:
-                if not input_ref in self.blocks_spending_input:
-                    self.blocks_spending_input[input_ref] = []
-                self.blocks_spending_input[input_ref].append(block.hash)
+        self.index_block(block, verdict)
         self._p_changed = True # Marked object as changed so changes get saved to ZODB.
         if save:
             transaction.commit() # If we're going to save the block, commit the transaction.
         return True
 
-    def get_heights_with_blocks(self):
-        """ Return all heights in the blockchain that contain blocks.
+    def add_blocks(self, blocks, commit_every=1000, processes=1):
+        """ Adds many blocks, committing to the database once per commit_every added blocks instead of once per block.
+
+        Seals are checked in one batch first (see Block.verify_seals). Blocks are then validated and
+        indexed in increasing height order, so parents are added before their children whatever the
+        input order; each block is checked exactly as in add_block, and invalid or duplicate blocks
+        are skipped. If an error is raised midway, the uncommitted part of
+        the current batch is rolled back with transaction.abort() and the error re-raised; blocks in
+        earlier batches stay committed.
+
+        Args:
+            blocks (iterable of :obj:`Block`): Blocks to add, in any order.
+            commit_every (int, optional): Number of added blocks per database commit (defaults to 1000).
+            processes (int, optional): Number of worker processes checking seals (defaults to 1; see Block.verify_seals).
 
         Returns:
-            (:obj:`list` of int): List of heights in the blockchain with blocks at that location.
+            (:obj:`list` of bool): add_block result of each block, in input order.
+        """
+        blocks = list(blocks)
+        # check all seals up front, so expensive (eg signature) checks can run in parallel
+        for block_type in set(type(block) for block in blocks):
+            block_type.verify_seals([block for block in blocks if type(block) is block_type], processes)
+        added = [False] * len(blocks)
+        uncommitted = 0
+        try:
+            for i in sorted(range(len(blocks)), key=lambda i: blocks[i].height):
+                added[i] = self.add_block(blocks[i], save=False)
+                if added[i]:
+                    uncommitted += 1
+                if uncommitted >= commit_every:
+                    transaction.commit()
+                    uncommitted = 0
+            if uncommitted > 0:
+                transaction.commit()
+        except Exception:
+            transaction.abort()
+            raise
+        return added
+
+    def index_block(self, block, verdict=(True, "All checks passed")):
+        """ Records an already validated block in every index of the blockchain (without committing).
+
+        Args:
+            block (:obj:`Block`): Block whose parent (if any) is already indexed.
+            verdict (bool, str): The block's is_valid() result, remembered in verdicts.
         """
-        all_heights = list(self.chain.keys())
-        all_heights.sort()
-        return all_heights
+        # add newer blocks to front so they show up first in UI
+        self.chain[block.height] = [block.hash] + self.chain.get(block.height, [])
+        self.blocks[block.hash] = block
+        self.verdicts[block.hash] = verdict
+        self.block_count += 1
+        self.skip_pointers[block.hash] = self.calculate_skip_pointers(block)
+        self.update_weights(block)
+        for tx in block.transactions:
+            self.all_transactions[tx.hash] = tx
+            self.blocks_containing_tx[tx.hash] = self.blocks_containing_tx.get(tx.hash, []) + [block.hash]
+            for input_ref in tx.input_refs:
+                self.blocks_spending_input[input_ref] = self.blocks_spending_input.get(input_ref, []) + [block.hash]
+        # the active chain (and the UTXO state materialized for it) follows the heaviest tip
+        self.reorganize(self.heaviest_tip)
+
+    def get_verdict(self, block_hash):
+        """ Return the validation verdict recorded when a block was added.
+
+        A block's hash fixes its contents and its parent, hence its whole ancestry, so its verdict never changes.
+
+        Args:
+            block_hash (str): Hash of the block.
+
+        Returns:
+            bool, str: The block's is_valid() result, or None if it is not in the blockchain.
+        """
+        return self.verdicts.get(block_hash)
+
+    def get_validity(self, block):
+        """ Return whether a block is valid, running Block.is_valid only for blocks not in the blockchain.
+
+        Args:
+            block (:obj:`Block`): Block to check.
+
+        Returns:
+            bool, str: True if block is valid, False otherwise plus an error or success message.
+        """
+        verdict = self.get_verdict(block.hash)
+        if verdict is None:
+            verdict = block.is_valid()
+        return verdict
+
+    def get_heights_with_blocks(self, min_height=None, max_height=None):
+        """ Return all heights in the blockchain that contain blocks, optionally within a range.
+
+        Args:
+            min_height (int, optional): Lowest height to return (defaults to no bound).
+            max_height (int, optional): Highest height to return (defaults to no bound).
+
+        Returns:
+            (:obj:`list` of int): List of heights in the blockchain with blocks at that location, in increasing order.
+        """
+        # range query on the height-ordered index; only the buckets in range are loaded
+        return list(self.chain.keys(min_height, max_height))
+
+    def get_max_height(self):
+        """ Return the highest height in the blockchain that contains blocks (-1 if empty). """
+        return self.chain.maxKey() if self.chain else -1
 
     def get_blockhashes_at_height(self, height):
         """ Return list of hashes of blocks at a particular height stored in the chain database.
@@ -108,6 +221,248 @@ class Blockchain(persistent.Persistent):
         # Placeholder for (1a)
         # return [block_hash]
 
+    def calculate_skip_pointers(self, block):
+        """ Compute the binary-lifting skip pointers of a block whose parent is already in the blockchain.
+
+        Args:
+            block (:obj:`Block`): Block to compute pointers for.
+
+        Returns:
+            (:obj:`list` of str): hashes of the block's 2^i-th ancestors for i = 0, 1, ... (empty for genesis).
+        """
+        if block.is_genesis:
+            return []
+        pointers = [block.parent_hash]
+        while len(self.skip_pointers[pointers[-1]]) >= len(pointers):
+            # the 2^(i+1)-th ancestor is the 2^i-th ancestor of the 2^i-th ancestor
+            pointers.append(self.skip_pointers[pointers[-1]][len(pointers) - 1])
+        return pointers
+
+    def get_ancestor(self, block_hash, height):
+        """ Return the hash of the ancestor of a block at the given height, in O(log height).
+
+        Args:
+            block_hash (str): Block hash of highest block in desired chain.
+            height (int): Height of the desired ancestor.
+
+        Returns:
+            str: hash of the block at that height on the chain ending with block_hash
+            (block_hash itself at its own height), or None if there is no such block.
+        """
+        if block_hash not in self.blocks:
+            return None
+        distance = self.blocks[block_hash].height - height
+        if distance < 0:
+            return None
+        level = 0
+        while distance > 0:
+            if distance & 1:
+                block_hash = self.skip_pointers[block_hash][level]
+            distance >>= 1
+            level += 1
+        return block_hash
+
+    def is_ancestor(self, ancestor_hash, block_hash):
+        """ Return True iff ancestor_hash is on the chain ending with block_hash (a block is its own ancestor).
+
+        Args:
+            ancestor_hash (str): Block hash of the candidate ancestor.
+            block_hash (str): Block hash of highest block in desired chain.
+
+        Returns:
+            bool: whether the chain ending with block_hash contains ancestor_hash; O(log height).
+        """
+        if ancestor_hash not in self.blocks:
+            return False
+        return self.get_ancestor(block_hash, self.blocks[ancestor_hash].height) == ancestor_hash
+
+    def get_common_ancestor(self, block_hash_a, block_hash_b):
+        """ Return the hash of the highest block on both the chains ending with the two provided hashes.
+
+        Args:
+            block_hash_a (str): Block hash of highest block in the first chain.
+            block_hash_b (str): Block hash of highest block in the second chain.
+
+        Returns:
+            str: hash of the fork point of the two chains, or None if they share no blocks.
+        """
+        if block_hash_a not in self.blocks or block_hash_b not in self.blocks:
+            return None
+        height = min(self.blocks[block_hash_a].height, self.blocks[block_hash_b].height)
+        block_hash_a = self.get_ancestor(block_hash_a, height)
+        block_hash_b = self.get_ancestor(block_hash_b, height)
+        if block_hash_a == block_hash_b:
+            return block_hash_a
+        # lift both sides by the largest jump that keeps them apart
+        for level in reversed(range(len(self.skip_pointers[block_hash_a]))):
+            if level < len(self.skip_pointers[block_hash_a]) and self.skip_pointers[block_hash_a][level] != self.skip_pointers[block_hash_b][level]:
+                block_hash_a = self.skip_pointers[block_hash_a][level]
+                block_hash_b = self.skip_pointers[block_hash_b][level]
+        if not self.skip_pointers[block_hash_a] or self.skip_pointers[block_hash_a][0] != self.skip_pointers[block_hash_b][0]:
+            return None # distinct genesis blocks
+        return self.skip_pointers[block_hash_a][0]
+
+    def get_path(self, from_hash, to_hash):
+        """ Return the blocks leaving and joining a chain whose end moves from one block to another.
+
+        The fork point is found with skip pointers (see get_common_ancestor), so this costs
+        O(log height) plus the number of blocks returned, whatever the length of the chain.
+
+        Args:
+            from_hash (str): Block hash of the current end of the chain (None for the empty chain).
+            to_hash (str): Block hash of its new end (None for the empty chain).
+
+        Returns:
+            (:obj:`list` of :obj:`Block`, :obj:`list` of :obj:`Block`): Blocks leaving the chain
+                (highest first) and blocks joining it (lowest first).
+        """
+        fork_point = self.get_common_ancestor(from_hash, to_hash)
+        disconnected = []
+        while from_hash != fork_point:
+            block = self.blocks[from_hash]
+            disconnected.append(block)
+            from_hash = None if block.is_genesis else block.parent_hash
+        connected = []
+        while to_hash != fork_point:
+            block = self.blocks[to_hash]
+            connected.append(block)
+            to_hash = None if block.is_genesis else block.parent_hash
+        connected.reverse()
+        return disconnected, connected
+
+    def get_utxo_view(self, block_hash):
+        """ Return a view of the UTXO state at the end of the chain ending with the provided hash.
+
+        Chains close to utxo_tip get an overlay of the materialized state (see get_utxo_overlay);
+        distant forks are answered by ancestor queries over blocks_containing_tx and
+        blocks_spending_input instead, so validation never walks more than a bounded number of blocks.
+
+        Args:
+            block_hash (str): Block hash of highest block in desired chain ("genesis" for the empty chain).
+
+        Returns:
+            (:obj:`UTXOView` or :obj:`AncestorView`): view of unspent outputs and included transactions on that chain.
+        """
+        if block_hash in self.blocks and self.utxo_tip is not None:
+            fork_point = self.get_common_ancestor(self.utxo_tip, block_hash)
+            fork_height = self.blocks[fork_point].height if fork_point is not None else -1
+            distance = self.blocks[self.utxo_tip].height + self.blocks[block_hash].height - 2 * fork_height
+            if distance > self.MAX_UTXO_VIEW_DISTANCE:
+                return AncestorView(self, block_hash)
+        return self.get_utxo_overlay(block_hash)
+
+    def get_utxo_overlay(self, block_hash):
+        """ Return an overlay of the materialized UTXO state for the chain ending with the provided hash.
+
+        The view is built from the materialized state at utxo_tip by disconnecting blocks down to
+        the common ancestor and connecting blocks up to block_hash, so it costs O(txs) in the blocks
+        between the two chain ends rather than O(chain length); extending utxo_tip is O(1).
+
+        Args:
+            block_hash (str): Block hash of highest block in desired chain ("genesis" for the empty chain).
+
+        Returns:
+            (:obj:`UTXOView`): view of unspent outputs and included transactions on that chain.
+        """
+        view = UTXOView(self.unspent_outputs, self.included_txs)
+        disconnected, connected = self.get_path(self.utxo_tip, block_hash if block_hash in self.blocks else None)
+        for block in disconnected:
+            view.disconnect(block)
+        for block in connected:
+            view.connect(block)
+        return view
+
+    def get_reorg_path(self, block_hash):
+        """ Return the blocks to disconnect from and connect to the active chain to make it end with the provided hash (see get_path).
+
+        Args:
+            block_hash (str): Block hash of highest block in the new active chain.
+
+        Returns:
+            (:obj:`list` of :obj:`Block`, :obj:`list` of :obj:`Block`): Blocks leaving the active chain
+                (highest first) and blocks joining it (lowest first).
+        """
+        return self.get_path(self.utxo_tip, block_hash)
+
+    def reorganize(self, block_hash):
+        """ Make the chain ending with the provided hash the active chain (without committing).
+
+        Only the blocks between the fork point and the two tips are applied, to active_chain and
+        to the materialized UTXO state (unspent_outputs, included_txs): extending the active chain
+        costs one block, and a reorg costs its depth rather than the length of the chain.
+
+        Args:
+            block_hash (str): Block hash of highest block in the new active chain.
+
+        Returns:
+            (:obj:`list` of :obj:`Block`, :obj:`list` of :obj:`Block`): Blocks disconnected (highest first)
+                and connected (lowest first), eg to return transactions to a mempool.
+        """
+        disconnected, connected = self.get_reorg_path(block_hash)
+        view = UTXOView(self.unspent_outputs, self.included_txs)
+        for block in disconnected:
+            view.disconnect(block)
+            del self.active_chain[block.height]
+        for block in connected:
+            view.connect(block)
+            self.active_chain[block.height] = block.hash
+        view.flush()
+        self.utxo_tip = block_hash
+        return disconnected, connected
+
+    def get_best_chain(self, min_height=None, max_height=None):
+        """ Return the block hashes of the best chain (the one ending with the heaviest tip), read from the active chain without walking it.
+
+        Args:
+            min_height (int, optional): Lowest height to return (defaults to genesis).
+            max_height (int, optional): Highest height to return (defaults to the heaviest tip).
+
+        Returns:
+            (:obj:`list` of str): hashes of the blocks on the best chain in range, in the descending order of height (as get_chain_ending_with).
+        """
+        return list(self.active_chain.values(min_height, max_height))[::-1]
+
+    def get_best_block_hash(self, height):
+        """ Return the hash of the block at a height of the best chain.
+
+        Args:
+            height (int): Desired height.
+
+        Returns:
+            str: hash of the block, or None if the best chain is shorter.
+        """
+        return self.active_chain.get(height)
+
+    def is_on_best_chain(self, block_hash):
+        """ Return True iff the block with the provided hash is on the best chain. """
+        return block_hash in self.blocks and self.active_chain.get(self.blocks[block_hash].height) == block_hash
+
+    def update_weights(self, block):
+        """ Record the total weight of a newly added block and update tip tracking, in O(log tips).
+
+        Ties in total weight are broken the way a scan in increasing height order (newest block first
+        at each height) would: the lower block wins, and at equal height the newer one.
+
+        Args:
+            block (:obj:`Block`): Block just added to self.blocks.
+        """
+        total_weight = block.get_weight()
+        if not block.is_genesis:
+            total_weight += self.total_weights[block.parent_hash]
+        self.total_weights[block.hash] = total_weight
+        if self.heaviest_tip is None:
+            self.heaviest_tip = block.hash
+        else:
+            heaviest_weight = self.total_weights[self.heaviest_tip]
+            if total_weight > heaviest_weight or (total_weight == heaviest_weight and block.height <= self.blocks[self.heaviest_tip].height):
+                self.heaviest_tip = block.hash
+        if block.parent_hash in self.tips:
+            self.tips_by_weight.remove(self.tips[block.parent_hash])
+            del self.tips[block.parent_hash]
+        tip_key = (-total_weight, block.height, -self.block_count, block.hash)
+        self.tips[block.hash] = tip_key
+        self.tips_by_weight.add(tip_key)
+
     def get_all_block_weights(self):
         """ Get total weight for every block in the blockchain database.
         (eg if a block is at height 3, and all blocks have weight 1, the block will have weight 4 across blocks 0,1,2,3)
@@ -115,15 +470,8 @@ class Blockchain(persistent.Persistent):
         Returns:
             (obj:`dict` of (str to int)): List mapping every blockhash to its total accumulated weight in the blockchain
         """
-        block_hashes_to_total_weights = {}
-        for height in self.get_heights_with_blocks():
-            for block_hash in self.get_blockhashes_at_height(height):
-                # dynamic programming; store map of blocks to weights and populate in increasing height order
-                block = self.blocks[block_hash]
-                block_hashes_to_total_weights[block_hash] = block.get_weight()
-                if not block.is_genesis:
-                    block_hashes_to_total_weights[block_hash] += block_hashes_to_total_weights[block.parent_hash]
-        return block_hashes_to_total_weights
+        # weights are accumulated once per block in add_block (see update_weights)
+        return dict(self.total_weights)
 
     def get_heaviest_chain_tip(self):
         """ Find the chain tip with the most accumulated total work.
@@ -135,15 +483,22 @@ class Blockchain(persistent.Persistent):
         Returns:
             (:obj:`Block`): block with the maximum total weight in db.
         """
+        if self.heaviest_tip is None:
+            return None
+        return self.blocks[self.heaviest_tip]
 
-        block_hashes_to_total_weights = self.get_all_block_weights()
-        heaviest_block = None
-        for block_hash in block_hashes_to_total_weights:
-            block = self.blocks[block_hash]
-            weight_in_block = block_hashes_to_total_weights[block_hash]
-            if heaviest_block == None or weight_in_block > heaviest_weight:
-                heaviest_block = block
-                heaviest_weight = weight_in_block
+    def get_top_k_tips(self, k):
+        """ Find the k chain tips with the most accumulated total work (eg to display competing forks).
 
-        return heaviest_block
+        Args:
+            k (int): Maximum number of tips to return.
 
+        Returns:
+            (:obj:`list` of :obj:`Block`): up to k tips, heaviest first.
+        """
+        top_tips = []
+        for tip_key in self.tips_by_weight:
+            if len(top_tips) >= k:
+                break
+            top_tips.append(self.blocks[tip_key[3]])
+        return top_tips
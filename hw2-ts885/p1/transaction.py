@@ -0,0 +1,90 @@
+from blockchain.util import encode_as_str, sha256_2_string
+import persistent
+
+class TransactionOutput(persistent.Persistent):
+
+    def __init__(self, sender, receiver, amount):
+        """ Class representing a transaction output in the UTXO model.
+
+        Args:
+            sender (str): Account sending (creating) the output.
+            receiver (str): Account receiving (and later potentially spending) the output.
+            amount (int): Amount being transferred.
+        """
+        self.sender = sender
+        self.receiver = receiver
+        self.amount = amount
+
+    def __repr__(self):
+        """ Gets unique string representation of an output. """
+        return encode_as_str([self.sender, self.receiver, self.amount], sep="~")
+
+def verify_hashes(transactions):
+    """ Checks the (possibly claimed) hashes of a list of transactions in one pass; each is hashed at most once, ever.
+
+    Each result is remembered on its transaction (see Transaction.hash_is_valid), so checking the
+    same transactions again, eg when a block is revalidated, is free.
+
+    Args:
+        transactions (:obj:`list` of :obj:`Transaction`): Transactions to check, eg all of a block's.
+
+    Returns:
+        bool: True iff every transaction's hash matches its contents.
+    """
+    return all(tx.hash_is_valid() for tx in transactions)
+
+class Transaction(persistent.Persistent):
+
+    def __init__(self, input_refs, outputs, claimed_hash=None):
+        """ Class representing a transaction in the UTXO model.
+        Each transaction consumes (spends) a list of inputs, and creates a list of outputs.
+
+        Args:
+            input_refs (:obj:`list` of str): References to every input in the form [tx_hash:list_index_of_output], 0-indexed.
+            outputs (:obj:`list` of :obj:`TransactionOutput`): Outputs created by the transaction. An output's index is its position in this list.
+            claimed_hash (str, optional): Hash received along with the transaction; trusted until
+                hash_is_valid() checks it (during block validation) instead of being computed here.
+        """
+        self.input_refs = input_refs
+        self.outputs = outputs
+        if claimed_hash is None:
+            self.hash = self.calculate_hash()
+            self._v_hash_valid = True
+        else:
+            self.hash = claimed_hash
+            self._v_hash_valid = None # not checked yet
+
+    def calculate_hash(self):
+        """ Get the hash of the block header.
+
+        Returns:
+            str: SHA256^2 hash of the block header.
+        """
+        return sha256_2_string(str(self.header()))
+
+    def hash_is_valid(self):
+        """ Checks that self.hash is the transaction's hash, computing it at most once per transaction.
+
+        Transactions loaded from the database were checked before their block was added, so
+        only transactions decoded with a claimed hash are ever hashed here.
+
+        Returns:
+            bool: True iff self.hash matches calculate_hash().
+        """
+        hash_valid = getattr(self, "_v_hash_valid", True)
+        if hash_valid is None:
+            hash_valid = self.hash == self.calculate_hash()
+            self._v_hash_valid = hash_valid
+        return hash_valid
+
+    def is_valid(self):
+        """ Checks if a transaction is well-formed, returning True iff a transaction obeys syntactic rules. """
+        return len(self.input_refs) < 10 and len(self.outputs) < 10 and len(self.input_refs) > 0 and len(self.outputs) > 0
+
+    def header(self):
+        """ Get string encoding of a transaction's header. """
+        return encode_as_str([";".join(self.input_refs), ";".join([str(out) for out in self.outputs])], sep="-")
+
+    def __repr__(self):
+        """ Get unique string encoding of a transaction, including its hash (ID). """
+        return encode_as_str([self.hash, self.header()], sep="-")
@@ -1,6 +1,7 @@
 import binascii
 import random
-from ecdsa import SigningKey, VerifyingKey
+import ecdsa
+from blockchain.keys import get_signing_key, get_verifying_key
 from hashlib import sha256
 
 
@@ -27,6 +28,51 @@ def sha256_2_string(string_to_hash):
     # Placeholder for (1a)
     # return "deadbeef" + hex(int(random.random() * 10000000))[2:]
 
+def sha256_midstate(prefix):
+    """ Returns a SHA256 object that has absorbed a fixed prefix, to be copied for every
+    message sharing that prefix (e.g. every nonce tried on the same unsealed header).
+
+    Args:
+        prefix (str): Prefix shared by the messages to hash.
+
+    Returns:
+        :obj:`hashlib.sha256`: Hash object in the state right after the prefix; never update it directly.
+    """
+    return sha256(prefix.encode('utf-8'))
+
+def sha256_2_from_midstate(midstate, suffix):
+    """ Returns the SHA256^2 hash of prefix + suffix in hexadecimal format,
+    where midstate was created from prefix by sha256_midstate.
+
+    Args:
+        midstate (:obj:`hashlib.sha256`): Hash object returned by sha256_midstate.
+        suffix (str): Remainder of the string to hash.
+
+    Returns:
+        str: Output of double-SHA256 encoded as hexadecimal string (same as sha256_2_string(prefix + suffix)).
+    """
+    first_hash = midstate.copy()
+    first_hash.update(suffix.encode('utf-8'))
+    return sha256(first_hash.digest()).hexdigest()
+
+def sha256_2_nonce_batch(midstate, start, count):
+    """ Hashes a batch of consecutive nonces appended to a common prefix in one call.
+
+    Args:
+        midstate (:obj:`hashlib.sha256`): Hash object returned by sha256_midstate.
+        start (int): First nonce to hash.
+        count (int): Number of nonces to hash.
+
+    Returns:
+        (:obj:`list` of int): SHA256^2 of prefix + str(nonce) as an integer, for each nonce in [start, start + count).
+    """
+    results = []
+    for nonce in range(start, start + count):
+        first_hash = midstate.copy()
+        first_hash.update(str(nonce).encode('utf-8'))
+        results.append(int.from_bytes(sha256(first_hash.digest()).digest(), 'big'))
+    return results
+
 def encode_as_str(list_to_encode, sep = "|"):
     """ Encodes a list as a string with given separator.
 
@@ -45,10 +91,18 @@ def remove_empties(list):
     return [x for x in list if x != ""]
 
 def sign_message(message, secret_key):
-    sk = SigningKey.from_string(binascii.unhexlify(secret_key))
+    """ Signs a string message under a hex-encoded secret key (parsed once, see blockchain.keys); returns the hex signature. """
+    sk = get_signing_key(secret_key)
     signature = sk.sign(message.encode("utf-8"))
     return signature.hex()
 
+def is_message_signed(message, signature, public_key):
+    """ Returns True iff a hex signature of a string message verifies under a hex-encoded public key (parsed once, see blockchain.keys). """
+    try:
+        return get_verifying_key(public_key).verify(binascii.unhexlify(signature), message.encode("utf-8"))
+    except (ecdsa.keys.BadSignatureError, binascii.Error):
+        return False
+
 def run_async(func):
     """
         ( source: http://code.activestate.com/recipes/576684-simple-threading-decorator/ )
@@ -0,0 +1,121 @@
+def output_refs(tx):
+    """ Returns the input references ([tx_hash:list_index_of_output]) to every output a transaction creates.
+
+    Args:
+        tx (:obj:`Transaction`): Transaction creating the outputs.
+
+    Returns:
+        (:obj:`list` of str): One reference per output, in output order.
+    """
+    return [tx.hash + ":" + str(i) for i in range(len(tx.outputs))]
+
+class UTXOView:
+
+    def __init__(self, unspent_outputs, included_txs):
+        """ A copy-on-write view of the UTXO state at the end of some chain.
+
+        Reads fall through to the base sets, which hold the state at the end of the chain
+        the Blockchain is currently anchored at (see Blockchain.utxo_tip); connecting and
+        disconnecting blocks only records changes in the view, so a view never mutates
+        the base until flush() is called.
+
+        Args:
+            unspent_outputs (:obj:`OOTreeSet` of str): Base set of unspent input references.
+            included_txs (:obj:`OOTreeSet` of str): Base set of transaction hashes included in the chain.
+
+        Attributes:
+            unspent_outputs (:obj:`OOTreeSet` of str): Base set of unspent input references.
+            included_txs (:obj:`OOTreeSet` of str): Base set of transaction hashes included in the chain.
+            output_changes (:obj:`dict` of (str to bool)): Maps input references to whether they are unspent in this view.
+            tx_changes (:obj:`dict` of (str to bool)): Maps transaction hashes to whether they are included in this view.
+        """
+        self.unspent_outputs = unspent_outputs
+        self.included_txs = included_txs
+        self.output_changes = {}
+        self.tx_changes = {}
+
+    def is_unspent(self, input_ref):
+        """ Returns True iff the output referenced by input_ref exists and is unspent in this view. """
+        if input_ref in self.output_changes:
+            return self.output_changes[input_ref]
+        return input_ref in self.unspent_outputs
+
+    def has_transaction(self, tx_hash):
+        """ Returns True iff the transaction with hash tx_hash is included in a block in this view. """
+        if tx_hash in self.tx_changes:
+            return self.tx_changes[tx_hash]
+        return tx_hash in self.included_txs
+
+    def connect(self, block):
+        """ Applies a block on top of the view: spends its inputs, creates its outputs.
+
+        Args:
+            block (:obj:`Block`): Block whose parent is the current end of the view.
+        """
+        for tx in block.transactions:
+            for input_ref in tx.input_refs:
+                self.output_changes[input_ref] = False
+            for output_ref in output_refs(tx):
+                self.output_changes[output_ref] = True
+            self.tx_changes[tx.hash] = True
+
+    def disconnect(self, block):
+        """ Rolls back a block from the view: removes its outputs, restores the outputs it spent.
+
+        Args:
+            block (:obj:`Block`): Block currently at the end of the view.
+        """
+        for tx in reversed(block.transactions):
+            self.tx_changes[tx.hash] = False
+            for output_ref in output_refs(tx):
+                self.output_changes[output_ref] = False
+            for input_ref in tx.input_refs:
+                self.output_changes[input_ref] = True
+
+    def flush(self):
+        """ Writes every change recorded in the view into the base sets and clears the view. """
+        for input_ref, unspent in self.output_changes.items():
+            if unspent:
+                self.unspent_outputs.add(input_ref)
+            else:
+                self.unspent_outputs.discard(input_ref)
+        for tx_hash, included in self.tx_changes.items():
+            if included:
+                self.included_txs.add(tx_hash)
+            else:
+                self.included_txs.discard(tx_hash)
+        self.output_changes = {}
+        self.tx_changes = {}
+
+class AncestorView:
+
+    def __init__(self, chain, block_hash):
+        """ A read-only view of the UTXO state at the end of a chain answered by ancestor queries.
+
+        Used for chain ends far from the materialized UTXO state; each lookup checks the blocks
+        containing a transaction (or spending an output) for ancestry with Blockchain.is_ancestor,
+        costing O(log height) per candidate block instead of a walk over the chain.
+
+        Args:
+            chain (:obj:`Blockchain`): Blockchain holding the indexes to query.
+            block_hash (str): Block hash of highest block in the viewed chain.
+        """
+        self.chain = chain
+        self.block_hash = block_hash
+
+    def is_on_chain(self, block_hashes):
+        """ Returns True iff any of the given blocks is on the viewed chain. """
+        return any(self.chain.is_ancestor(block_hash, self.block_hash) for block_hash in block_hashes)
+
+    def is_unspent(self, input_ref):
+        """ Returns True iff the output referenced by input_ref exists and is unspent in this view. """
+        in_tx_hash, in_output_idx = input_ref.split(":")
+        if not self.has_transaction(in_tx_hash):
+            return False
+        if int(in_output_idx) >= len(self.chain.all_transactions[in_tx_hash].outputs):
+            return False
+        return not self.is_on_chain(self.chain.blocks_spending_input.get(input_ref, []))
+
+    def has_transaction(self, tx_hash):
+        """ Returns True iff the transaction with hash tx_hash is included in a block in this view. """
+        return self.is_on_chain(self.chain.blocks_containing_tx.get(tx_hash, []))
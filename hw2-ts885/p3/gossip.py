@@ -15,68 +15,353 @@ sys.path.append(parent)
 
 import config
 import requests
-import importlib
+import threading
+import queue
+import atexit
+import time
+import collections
 from p2p import synchrony
-from p2p.interfaces.block import string_to_block
-from blockchain.util import run_async
+from p2p.interfaces.block import read_block_header, read_block_transactions
+from blockchain.encoding import Reader
+
+#: Message types whose payload is binary (see Block.to_bytes); all others are UTF-8 text
+BINARY_MESSAGE_TYPES = set(["addblock"])
+
+#: Maximum number of messages waiting to be sent to one peer
+PEER_QUEUE_SIZE = 256
+
+#: Seconds send_message waits for room in a full peer queue before dropping the message
+PEER_QUEUE_TIMEOUT = 2
+
+#: Seconds a node waits on exit for queued messages to be delivered
+EXIT_FLUSH_TIMEOUT = 10
+
+#: Number of block hashes remembered as already in our chain, checked before decoding or looking up any block
+SEEN_CACHE_SIZE = 10000
+
+#: Seconds to wait for a block requested with getdata before requesting it from another peer announcing it
+GETDATA_TIMEOUT = 5
+
+class LRUCache:
+
+    def __init__(self, capacity):
+        """ Thread-safe mapping that only keeps its capacity most recently used keys.
+
+        Args:
+            capacity (int): Maximum number of keys kept; the least recently used key is evicted first.
+        """
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        """ Returns True iff key is cached, marking it as recently used. """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return True
+            return False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """ Returns the value cached for key (marking it as recently used), or default. """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            return default
+
+    def put(self, key, value=True):
+        """ Caches a value for key, evicting the least recently used key if over capacity. """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """ Removes key, returning its value (or default if not cached). """
+        with self.lock:
+            return self.entries.pop(key, default)
+
+class BlockRequests:
+
+    def __init__(self, capacity, timeout=GETDATA_TIMEOUT):
+        """ Thread-safe tracker of blocks requested with getdata, and of the other peers announcing them.
+
+        A block is requested from the first peer announcing it; later announcers wait in line, and
+        when the request times out (the peer is down, its queue is full, or the block it sent was
+        dropped) the block is requested from the next one (see expire).
+
+        Args:
+            capacity (int): Maximum number of blocks tracked; the oldest request is dropped first.
+            timeout (float, optional): Seconds to wait for a requested block before asking the next peer.
+
+        Attributes:
+            requests (:obj:`OrderedDict` of (str to (float, :obj:`deque` of str))): Maps requested block hashes
+                to when their request times out and the peers to ask next, oldest request first.
+        """
+        self.capacity = capacity
+        self.timeout = timeout
+        self.requests = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, block_hash):
+        with self.lock:
+            return block_hash in self.requests
+
+    def announce(self, block_hash, peer, now=None):
+        """ Records that a peer has a block.
+
+        Returns:
+            bool: True iff the block should be requested from peer now (it was not requested yet).
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            if block_hash in self.requests:
+                waiting = self.requests[block_hash][1]
+                if peer not in waiting:
+                    waiting.append(peer)
+                return False
+            self.requests[block_hash] = (now + self.timeout, collections.deque())
+            if len(self.requests) > self.capacity:
+                self.requests.popitem(last=False)
+            return True
+
+    def received(self, block_hash):
+        """ Stops tracking a block, once it is in our chain (or known to be invalid). """
+        with self.lock:
+            self.requests.pop(block_hash, None)
+
+    def expire(self, now=None):
+        """ Moves every timed out request to the next peer announcing its block; requests with no peer left are dropped.
+
+        Returns:
+            (:obj:`list` of (str, str)): (block hash, peer) pairs to send getdata for.
+        """
+        now = time.time() if now is None else now
+        retries = []
+        with self.lock:
+            for block_hash, (deadline, waiting) in list(self.requests.items()):
+                if deadline > now:
+                    continue
+                if not waiting:
+                    del self.requests[block_hash]
+                    continue
+                peer = waiting.popleft()
+                self.requests[block_hash] = (now + self.timeout, waiting)
+                retries.append((block_hash, peer))
+        return retries
+
+# hashes of blocks known to be in (or queued for) our chain, and of blocks requested with getdata;
+# touched by handle_message and by the chain service's worker (see block_handled)
+seen_blocks = LRUCache(SEEN_CACHE_SIZE)
+block_requests = BlockRequests(SEEN_CACHE_SIZE)
+
+# thread re-requesting timed out blocks (see run_request_retries), started by the first request
+retry_thread = None
+retry_thread_lock = threading.Lock()
+
+# when set (by p2p.async_node while an asyncio node runs), send_message hands messages to it instead of the queues below
+message_sender = None
+
+# one bounded outgoing queue (drained by one sender thread) per destination, created on first use
+peer_queues = {}
+peer_queues_lock = threading.Lock()
+
+def get_peer_queue(dest):
+    """ Returns the outgoing message queue of a destination, starting its sender thread if needed. """
+    with peer_queues_lock:
+        if dest not in peer_queues:
+            peer_queues[dest] = queue.Queue(PEER_QUEUE_SIZE)
+            threading.Thread(target=run_peer_sender, args=(dest, peer_queues[dest]), daemon=True).start()
+        return peer_queues[dest]
+
+def run_peer_sender(dest, messages):
+    """ Sender thread of one destination; posts its queued messages in order over one keep-alive session.
+
+        Args:
+            dest (str): IP address of receiver.
+            messages (:obj:`Queue` of (str, str or bytes)): Queue of (type, payload) to deliver.
+    """
+    session = requests.Session()
+    while True:
+        type, message = messages.get()
+        try:
+            print(session.post(dest + "p2pmessage/" + type + "/" + str(config.receiving_port), data=message, timeout=2).text)
+        except Exception as e:
+            print("[p2p error] Message failed to send to", dest)
+            print(e)
+        messages.task_done()
+
+def flush_messages(timeout=None):
+    """ Waits until every queued message has been sent (or failed to send).
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait (defaults to no limit).
+
+        Returns:
+            bool: True if all queues were drained, False on timeout.
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    with peer_queues_lock:
+        queues = list(peer_queues.values())
+    for messages in queues:
+        with messages.all_tasks_done:
+            while messages.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                messages.all_tasks_done.wait(remaining)
+    return True
+
+# sender threads are daemons, so give short-lived scripts (eg generate_example_pow_chain.py) a chance to deliver
+atexit.register(flush_messages, EXIT_FLUSH_TIMEOUT)
 
-@run_async
 def send_message(dest, type, message):
     """ Send message to destination node over point-to-point network.
 
+        Messages are queued for the destination's sender thread, so this returns without waiting
+        for the network; if the destination falls PEER_QUEUE_SIZE messages behind, this blocks for
+        up to PEER_QUEUE_TIMEOUT seconds and then drops the message.
+
         Args:
             dest (str): IP address of receiver.
             type (str): Type of message to process as; unknown types are ignored.
-            message (str): Payload to deliver to destination to be processed based on type.
+            message (str or bytes): Payload to deliver to destination to be processed based on type.
     """
+    if not isinstance(message, (bytes, bytearray)):
+        message = str(message)
+    if message_sender is not None:
+        message_sender(dest, type, message)
+        return
     try:
-        print(requests.post(dest + "p2pmessage/" + type + "/" + str(config.receiving_port), data=str(message), timeout=2).text)
-    except Exception as e:
-        print("[p2p error] Message failed to send to", dest)
-        print(e)
+        get_peer_queue(dest).put((type, message), timeout=PEER_QUEUE_TIMEOUT)
+    except queue.Full:
+        print("[p2p error] Send queue to", dest, "is full; message dropped")
 
 def gossip_message(type, message):
     """ Send message to all known nodes over point-to-pont network (broadcast).
 
         Args:
             type (str): Type of message to process as; unknown types are ignored.
-            message (str): Payload to deliver to destination to be processed based on type.
+            message (str or bytes): Payload to deliver to destination to be processed based on type.
     """
     # (you should use send_message as a primitive; also see the config file)
 
     # (placeholder for 3.1)
     # implement here
+    if not isinstance(message, (bytes, bytearray)):
+        message = str(message) # serialize once for all peers
     self_node_id = config.node_id
     for key, value in config.PEERS.items():
         if key != self_node_id:
             send_message(value, type, message)
 
+def request_block(block_hash, peer):
+    """ Sends getdata for a block to a peer having it, unless the block is already requested from
+        another peer; peer is then asked if that request times out.
+
+        Args:
+            block_hash (str): Hash of the block to fetch.
+            peer (str): IP address of a peer having the block.
+    """
+    global retry_thread
+    with retry_thread_lock:
+        if retry_thread is None:
+            retry_thread = threading.Thread(target=run_request_retries, daemon=True)
+            retry_thread.start()
+    if block_requests.announce(block_hash, peer):
+        send_message(peer, "getdata", block_hash)
+
+def run_request_retries():
+    """ Retry thread; once a second, asks the next announcing peer for every block whose getdata timed out. """
+    while True:
+        time.sleep(1)
+        for block_hash, peer in block_requests.expire():
+            if block_hash not in seen_blocks:
+                send_message(peer, "getdata", block_hash)
+
+def request_parent(block, sender):
+    """ Called by the chain service when a block from sender is parked as an orphan; fetches its missing parent from sender. """
+    if block.parent_hash not in seen_blocks:
+        request_block(block.parent_hash, sender)
+
+def block_handled(block, added):
+    """ Called by the chain service once a block received in an addblock message has been handled.
+
+        Args:
+            block (:obj:`Block`): The received block.
+            added (bool): True iff the block was new and valid, and is now in our chain.
+    """
+    from blockchain import chaindb # chaindb.chain is safe to use here, on the chain service's worker
+    if added:
+        block_requests.received(block.hash)
+        # if it's a valid block we haven't seen, announce it; peers without it fetch it from us
+        gossip_message("inv", block.hash)
+    elif chaindb.chain.get_verdict(block.hash) is None:
+        # invalid for now (eg evicted orphan) or a bad copy; let a later copy, or the next announcer's, retry
+        seen_blocks.pop(block.hash)
+    else:
+        block_requests.received(block.hash)
+
 def handle_message(type, message, sender):
     """ Used to handle an incoming message sent by another node (heh-heh-heyyyy!).
 
         Args:
             type (str): Type of message to process as; unknown types are ignored.
-            message (str): Payload to deliver to subcomponent based on type.
+            message (str or bytes): Payload to deliver to subcomponent based on type (bytes for BINARY_MESSAGE_TYPES).
             sender (str): Sender of message (primarily used to find key in PKI).
     """
     print("SENDER", sender)
 
+    if type == "inv":
+        # A peer announces a block by hash; fetch it from one peer at a time, unless we have it
+        block_hash = message
+        if block_hash in seen_blocks:
+            return
+        if block_hash in block_requests:
+            request_block(block_hash, sender) # already asked another peer; remember this one in case it doesn't answer
+            return
+        from blockchain import chaindb
+        with chaindb.read_chain() as chain:
+            verdict = chain.get_verdict(block_hash)
+        if verdict is not None: # added (and validated) already
+            seen_blocks.put(block_hash)
+            return
+        request_block(block_hash, sender)
+
+    if type == "getdata":
+        # Send a block we announced to the peer asking for it
+        from blockchain import chaindb
+        with chaindb.read_chain() as chain:
+            block = chain.blocks.get(message)
+            encoded = block.to_bytes() if block is not None else None
+        if encoded is not None:
+            send_message(sender, "addblock", encoded)
+
     if type == "addblock":
-        # Add block to blockchain
-        block = string_to_block(message)
+        # Add block to blockchain; the header alone gives the hash, so known blocks are dropped before decoding transactions
+        reader = Reader(message)
+        try:
+            block = read_block_header(reader)
+        except (ValueError, UnicodeDecodeError):
+            return
+        if block.hash in seen_blocks:
+            return
+        try:
+            read_block_transactions(reader, block)
+        except (ValueError, UnicodeDecodeError):
+            return
+        print("[p2p] Blockhash imported", block.hash)
+        # the chain service validates and adds it on its own thread; copies arriving meanwhile are dropped as seen
         from blockchain import chaindb
-        chaindb.connection.close()
-        chaindb.db.close()
-        importlib.reload(chaindb)
-        chain = chaindb.chain
-        #print(block)
-        print(block.is_valid())
-        if not block.hash in chain.blocks and block.is_valid()[0]:
-            # if it's a valid block we haven't seen, retransmit
-            chain.add_block(block)
-            gossip_message(type, message)
-        chaindb.connection.close()
-        chaindb.db.close()
+        seen_blocks.put(block.hash)
+        if not chaindb.get_service().submit(block, block_handled, lambda block: request_parent(block, sender)):
+            seen_blocks.pop(block.hash)
+            print("[p2p error] Chain service queue is full; block dropped")
 
     if type == "synchrony-start":
         # Kick off the round-based synchrony tracker
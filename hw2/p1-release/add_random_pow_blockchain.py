@@ -1,8 +1,10 @@
 import blockchain
 from blockchain.transaction import Transaction, TransactionOutput
 from blockchain.pow_block import PoWBlock
+from blockchain.mempool import Mempool
 import transaction
 import random
+import os
 import config
 
 if len(blockchain.chain.chain) > 0:
@@ -13,6 +15,7 @@ USERS = ["Alice", "Bob", "Charlie", "Dave", "Errol", "Frank"]
 HEIGHT_TO_REACH = 100
 MAX_TXS_PER_BLOCK = 50
 FORK_PROBABILITY = .3
+MAX_TRIES_PER_TX = 100
 
 # basic wallet functionality; track UTXOs for users
 user_utxos = {}
@@ -33,22 +36,20 @@ blockchain.chain.add_block(genesis_block)
 
 curr_height = 1
 parent = genesis_block
+# transactions waiting for a block; follows parent across forks, keeping what is still valid there
+mempool = Mempool(blockchain.chain, genesis_block.hash)
 
 
 while curr_height <= HEIGHT_TO_REACH:
     chain = blockchain.chain
-    txs = []
     if random.random() < FORK_PROBABILITY:
         if parent.parent_hash == "genesis":
             continue
         curr_height -= 1
         new_parent_hash = random.choice(chain.chain[curr_height - 1]) # fork random previous block
         parent = chain.blocks[new_parent_hash]
-
-    eligible_parents = [chain.blocks[block_hash] for block_hash in chain.get_chain_ending_with(parent.hash)]
-    eligible_txs = []
-    for parent_candidate in eligible_parents:
-        eligible_txs += [tx.hash for tx in parent_candidate.transactions]
+    mempool.set_tip(parent.hash)
+    view = mempool.get_view()
 
     num_txs = int(random.random() * MAX_TXS_PER_BLOCK)
     if curr_height < 10:
@@ -59,32 +60,30 @@ while curr_height <= HEIGHT_TO_REACH:
         receiver = random.choice(USERS)
         if len(user_utxos[sender]) == 0:
             continue
-        parent_utxo = random.choice(user_utxos[sender])
-        tries = 0
-        while not parent_utxo[0].split(":")[0] in eligible_txs:
+        # pick one of the sender's outputs that is spendable on this fork
+        for tries in range(MAX_TRIES_PER_TX):
             parent_utxo = random.choice(user_utxos[sender])
-            tries += 1
-            if tries > 200000:
+            if mempool.is_spendable(parent_utxo[0], view):
                 break
-        if tries > 200000:
-            break
-        user_utxos[sender].remove(parent_utxo)
+        else:
+            continue
         amount_to_send = int(parent_utxo[1] * random.random())
         change_amount = parent_utxo[1] - amount_to_send
         sending_utxo = TransactionOutput(sender, receiver, amount_to_send)
         change_utxo = TransactionOutput(sender, sender, change_amount)
         tx = Transaction([parent_utxo[0]], [sending_utxo, change_utxo])
-        txs.append(tx)
-        eligible_txs.append(tx.hash)
+        if not mempool.add(tx, view):
+            continue
+        user_utxos[sender].remove(parent_utxo)
         user_utxos[receiver].append((tx.hash + ":0", amount_to_send))
         user_utxos[sender].append((tx.hash + ":1", change_amount))
 
-    block = PoWBlock(curr_height, txs, parent.hash)
-    block.mine()
+    block = PoWBlock(curr_height, mempool.build_template(), parent.hash)
+    hash_rate = block.mine(processes=os.cpu_count()) # this script runs no other threads, so mining workers can be forked
     out_status = chain.add_block(block)
     if not out_status:
         # block add failed; try again
         continue
-    print("Added block at height", curr_height)
+    print("Added block at height", curr_height, "(mined at", int(hash_rate), "hashes/s)")
     curr_height += 1
     parent = block
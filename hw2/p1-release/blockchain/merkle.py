@@ -0,0 +1,162 @@
+import binascii
+from hashlib import sha256
+
+#: Size in bytes of every node digest stored in a MerkleTree
+DIGEST_SIZE = 32
+
+# PADDING_DIGESTS[i] is the root of a perfect subtree of height i built only from padding leaves
+PADDING_DIGESTS = [sha256(sha256(b"").digest()).digest()]
+
+def padding_digest(level):
+    """ Returns the digest of a node at the given level whose subtree contains only padding leaves.
+
+    Padding leaves are SHA256^2(""); each padding subtree is hashed once per process and reused.
+
+    Args:
+        level (int): Level of the node (0 for leaves).
+
+    Returns:
+        bytes: Raw 32-byte digest of the padding node.
+    """
+    while len(PADDING_DIGESTS) <= level:
+        PADDING_DIGESTS.append(hash_pair(binascii.hexlify(PADDING_DIGESTS[-1]) * 2))
+    return PADDING_DIGESTS[level]
+
+def hash_pair(hex_pair):
+    """ Returns the raw SHA256^2 digest of two child digests already hex-encoded and concatenated.
+
+    Args:
+        hex_pair (bytes): ASCII hex of the left digest followed by ASCII hex of the right digest.
+
+    Returns:
+        bytes: Raw 32-byte digest of the parent node.
+    """
+    return sha256(sha256(hex_pair).digest()).digest()
+
+def leaf_digest(tx):
+    """ Returns the raw Merkle leaf digest of a transaction, SHA256^2(str(tx)).
+
+    Args:
+        tx (:obj:`Transaction`): Transaction to hash.
+
+    Returns:
+        bytes: Raw 32-byte digest of the leaf.
+    """
+    return sha256(sha256(str(tx).encode("utf-8")).digest()).digest()
+
+class MerkleTree:
+
+    def __init__(self, transactions=()):
+        """ Merkle tree over a list of transactions, keeping every level for proofs and appends.
+
+        Follows the block Merkle rules: leaves are SHA256^2(str(tx)), the leaf level is padded to
+        a power of two with SHA256^2(""), and a parent is the SHA256^2 of the hex strings of its
+        children concatenated. Only nodes covering at least one real leaf are stored; nodes over
+        padding only come from padding_digest.
+
+        Args:
+            transactions (:obj:`list` of :obj:`Transaction`, optional): Initial leaves, in block order.
+
+        Attributes:
+            levels (:obj:`list` of bytearray): Raw digests per level, leaves first, packed DIGEST_SIZE bytes per node.
+        """
+        self.levels = [bytearray()]
+        for tx in transactions:
+            self.levels[0] += leaf_digest(tx)
+        # build parents a level at a time from contiguous child pairs
+        level = 0
+        while self.level_size(level) > 1:
+            children = memoryview(self.levels[level])
+            parents = bytearray()
+            pair_count = self.level_size(level) // 2
+            for i in range(pair_count):
+                parents += hash_pair(binascii.hexlify(children[2 * i * DIGEST_SIZE:(2 * i + 2) * DIGEST_SIZE]))
+            if self.level_size(level) % 2 == 1:
+                parents += hash_pair(binascii.hexlify(children[-DIGEST_SIZE:]) + binascii.hexlify(padding_digest(level)))
+            self.levels.append(parents)
+            level += 1
+
+    def __len__(self):
+        """ Returns the number of (real) leaves in the tree. """
+        return self.level_size(0)
+
+    def level_size(self, level):
+        """ Returns the number of stored nodes at a level. """
+        return len(self.levels[level]) // DIGEST_SIZE
+
+    def node(self, level, index):
+        """ Returns the raw digest of a node, falling back to padding past the stored nodes. """
+        if index >= self.level_size(level):
+            return padding_digest(level)
+        return bytes(self.levels[level][index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE])
+
+    def append(self, tx):
+        """ Adds a transaction as the next leaf, rehashing only its path to the root (O(log n)).
+
+        Args:
+            tx (:obj:`Transaction`): Transaction to append.
+        """
+        self.levels[0] += leaf_digest(tx)
+        index = self.level_size(0) - 1
+        level = 0
+        while self.level_size(level) > 1:
+            if len(self.levels) == level + 1:
+                self.levels.append(bytearray())
+            parent = hash_pair(binascii.hexlify(self.node(level, index & ~1)) + binascii.hexlify(self.node(level, index | 1)))
+            index //= 2
+            if index < self.level_size(level + 1):
+                self.levels[level + 1][index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE] = parent
+            else:
+                self.levels[level + 1] += parent
+            level += 1
+
+    def root(self):
+        """ Gets the Merkle root; SHA256^2("") for no transactions, the leaf hash for one.
+
+        Returns:
+            str: Hex-encoded Merkle root.
+        """
+        if len(self) == 0:
+            return binascii.hexlify(padding_digest(0)).decode("ascii")
+        return binascii.hexlify(self.levels[-1][:DIGEST_SIZE]).decode("ascii")
+
+    def get_proof(self, tx_index):
+        """ Gets the Merkle inclusion proof of a transaction from the stored levels (no hashing).
+
+        Args:
+            tx_index (int): Position of the transaction in the block.
+
+        Returns:
+            (:obj:`list` of str): Hex-encoded sibling digests from the leaf level up to (excluding) the root;
+            the sibling is on the right at levels where the running index is even.
+        """
+        if tx_index < 0 or tx_index >= len(self):
+            raise IndexError("transaction index out of range")
+        proof = []
+        index = tx_index
+        for level in range(len(self.levels) - 1):
+            proof.append(binascii.hexlify(self.node(level, index ^ 1)).decode("ascii"))
+            index //= 2
+        return proof
+
+def verify_merkle_proof(leaf_hash, tx_index, proof, merkle_root):
+    """ Checks a Merkle inclusion proof (as returned by MerkleTree.get_proof) in O(log n) hashes.
+
+    Args:
+        leaf_hash (str): Hex-encoded leaf of the transaction, SHA256^2(str(tx)).
+        tx_index (int): Position of the transaction in its block.
+        proof (:obj:`list` of str): Hex-encoded sibling digests from the leaf level up.
+        merkle_root (str): Hex-encoded Merkle root from the (trusted) block header.
+
+    Returns:
+        bool: True iff the proof places the leaf at tx_index under merkle_root.
+    """
+    node = binascii.unhexlify(leaf_hash)
+    index = tx_index
+    for sibling in proof:
+        if index % 2 == 0:
+            node = hash_pair(binascii.hexlify(node) + sibling.encode("ascii"))
+        else:
+            node = hash_pair(sibling.encode("ascii") + binascii.hexlify(node))
+        index //= 2
+    return index == 0 and binascii.hexlify(node).decode("ascii") == merkle_root
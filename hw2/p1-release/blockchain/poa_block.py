@@ -1,11 +1,61 @@
 
 import blockchain
 from blockchain.block import Block
-from blockchain.util import sign_message
+from blockchain.keys import get_signing_key, get_verifying_key
 import config
 import binascii
 import ecdsa
-from ecdsa import VerifyingKey
+import multiprocessing
+import atexit
+
+#: Number of seals handed to a verification worker per task
+SEALS_PER_TASK = 16
+
+# process pool shared by all batch seal checks (created lazily)
+verification_pool = None
+verification_pool_size = None
+
+def get_verification_pool(processes):
+    """ Returns the shared seal verification pool with the given number of worker processes, creating it if needed. """
+    global verification_pool, verification_pool_size
+    if verification_pool is None or verification_pool_size != processes:
+        if verification_pool is not None:
+            verification_pool.terminate()
+        # fork where possible; spawned workers would re-import blockchain and try to reopen the locked database
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        verification_pool = context.Pool(processes)
+        verification_pool_size = processes
+    return verification_pool
+
+def terminate_verification_pool():
+    """ Terminates the seal verification pool's worker processes, if any; runs at exit. """
+    if verification_pool is not None:
+        verification_pool.terminate()
+
+atexit.register(terminate_verification_pool)
+
+def verify_seal(seal_data, unsealed_header, public_key):
+    """ Checks a PoA seal, ie that seal_data is the signature of the unsealed header under the block's public key.
+
+    Args:
+        seal_data (int): Seal data of the block (the signature as an integer).
+        unsealed_header (str): The block's header without seal data.
+        public_key (str): Hex-encoded public key the block is sealed under (see PoABlock.get_public_key).
+
+    Returns:
+        bool: True only if the signature is valid under the public key.
+    """
+    if seal_data == 0:
+        return False
+    # Decode signature to bytes, verify it
+    signature = binascii.unhexlify(hex(seal_data)[2:].zfill(96))
+    try:
+        return get_verifying_key(public_key).verify(signature, unsealed_header.encode("utf-8"))
+    except ecdsa.keys.BadSignatureError:
+        return False
 
 class PoABlock(Block):
     """ Extends Block, adding proof-of-work primitives. """
@@ -18,16 +68,39 @@ class PoABlock(Block):
             Returns:
                 bool: True only if a block's seal data forms a valid seal according to PoA.
         """
-        if self.seal_data == 0:
-            return False
+        # reuse a result from verify_seals if neither the header nor the seal changed since
+        seal = self.get_seal()
+        checked = getattr(self, "_v_seal_check", None)
+        if checked is not None and checked[0] == seal:
+            return checked[1]
+        return verify_seal(*seal)
+
+    def get_seal(self):
+        """ Returns the arguments of verify_seal for this block: its seal data, unsealed header and hex-encoded public key. """
+        return self.seal_data, self.unsealed_header(), binascii.hexlify(self.get_public_key()).decode("ascii")
+
+    @classmethod
+    def verify_seals(cls, blocks, processes=1):
+        """ Checks the seals of many blocks, optionally across a process pool, remembering each result on its block.
+
+        Workers are forked from the calling process, so only ask for more than one process from
+        single-threaded scripts (not from a node, whose threads and open database would be copied).
 
-        # Decode signature to bytes, verify it
-        signature = binascii.unhexlify(hex(self.seal_data)[2:].zfill(96))
-        pk = VerifyingKey.from_string(self.get_public_key())
-        try:
-            return pk.verify(signature, self.unsealed_header().encode("utf-8"))
-        except ecdsa.keys.BadSignatureError:
-            return False
+        Args:
+            blocks (:obj:`list` of :obj:`PoABlock`): Blocks to check.
+            processes (int, optional): Number of worker processes to use (defaults to 1, checking in this process).
+
+        Returns:
+            (:obj:`list` of bool): seal_is_valid() of each block, in order.
+        """
+        seals = [block.get_seal() for block in blocks]
+        if processes == 1 or len(seals) <= SEALS_PER_TASK:
+            results = [verify_seal(*seal) for seal in seals]
+        else:
+            results = get_verification_pool(processes).starmap(verify_seal, seals, SEALS_PER_TASK)
+        for block, seal, result in zip(blocks, seals, results):
+            block._v_seal_check = (seal, result)
+        return results
 
     def get_weight(self):
         """ Gets the approximate total amount of work that has gone into making a block.
@@ -52,11 +125,11 @@ class PoABlock(Block):
             
         # Use NIST192p curve and ECDSA, encoding block header as UTF-8
         
+        signing_key = get_signing_key(binascii.hexlify(self.get_private_key()).decode("ascii")) # parsed once, see blockchain.keys
         while True:  
-        # Sign message using private key (sign_message uses NIST192p curve internally)
+        # Sign message using the authority's NIST192p key
             message = self.unsealed_header()
-            private_key_hex = binascii.hexlify(self.get_private_key()).decode('utf-8')
-            signature = sign_message(message, private_key_hex)
+            signature = signing_key.sign(message.encode("utf-8")).hex()
             signature_int = int(signature, 16)
         
             self.set_seal_data(signature_int)
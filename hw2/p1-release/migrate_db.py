@@ -0,0 +1,28 @@
+import sys
+import config
+
+# usage: python migrate_db.py [path to database, defaults to config.DB_PATH]
+if len(sys.argv) > 1:
+    config.DB_PATH = sys.argv[1]
+
+import blockchain
+from blockchain.chain import Blockchain
+from BTrees.OOBTree import OOBTree
+import transaction
+
+old_chain = blockchain.connection.root.blockchain
+if isinstance(old_chain.blocks, OOBTree) and hasattr(old_chain, "active_chain"):
+    print("Blockchain in " + config.DB_PATH + " already uses the current indexes; nothing to migrate.")
+    exit(0)
+
+# blocks were validated when first added, so only rebuild the indexes (recording them as valid); parents always sit at lower heights
+new_chain = Blockchain()
+for height in sorted(old_chain.chain.keys()):
+    for block_hash in reversed(old_chain.chain[height]): # lists hold the newest block first
+        new_chain.index_block(old_chain.blocks[block_hash])
+blockchain.connection.root.blockchain = new_chain
+transaction.commit()
+
+# drop the old dict-backed records from the file
+blockchain.db.pack()
+print("Migrated", new_chain.block_count, "blocks in", config.DB_PATH, "to the current indexes.")
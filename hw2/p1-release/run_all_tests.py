@@ -4,7 +4,10 @@ from tests.weight import WeightTest
 from tests.get_chain import GetChainTest
 from tests.validity import ValidityTest
 from tests.poa import PoATest
+from tests.pow import PoWTest
 from tests.merkle import MerkleRootTest
+from tests.utxo import UTXOTest
+from tests.mempool import MempoolTest
 
 # Test for (1a) - sha256_2_string
 suite = unittest.TestLoader().loadTestsFromTestCase(HashTest)
@@ -26,6 +29,18 @@ unittest.TextTestRunner(verbosity=2).run(suite)
 suite = unittest.TestLoader().loadTestsFromTestCase(PoATest)
 unittest.TextTestRunner(verbosity=2).run(suite)
 
+# Test for (1b) - PoW mine
+suite = unittest.TestLoader().loadTestsFromTestCase(PoWTest)
+unittest.TextTestRunner(verbosity=2).run(suite)
+
 # Test for (1c) - calculate_merkle_root
 suite = unittest.TestLoader().loadTestsFromTestCase(MerkleRootTest)
 unittest.TextTestRunner(verbosity=2).run(suite)
+
+# Test for incremental UTXO index - get_utxo_view
+suite = unittest.TestLoader().loadTestsFromTestCase(UTXOTest)
+unittest.TextTestRunner(verbosity=2).run(suite)
+
+# Test for transaction pool - build_template
+suite = unittest.TestLoader().loadTestsFromTestCase(MempoolTest)
+unittest.TextTestRunner(verbosity=2).run(suite)
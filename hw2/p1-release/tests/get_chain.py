@@ -1,6 +1,8 @@
 import unittest
 import blockchain
 import time
+import ZODB
+import transaction
 from blockchain.util import sha256_2_string
 from blockchain.pow_block import PoWBlock
 from blockchain.transaction import Transaction, TransactionOutput
@@ -11,6 +13,12 @@ class TestBlock(PoWBlock):
     def seal_is_valid(self):
         return True
 
+class FailingBlock(TestBlock):
+    """ We want to test recovery from errors raised while adding blocks """
+
+    def is_valid(self):
+        raise RuntimeError("validation failed")
+
 class GetChainTest(unittest.TestCase):
 
     def setUp(self):
@@ -60,6 +68,89 @@ class GetChainTest(unittest.TestCase):
         self.assertEqual(self.test_chain.get_chain_ending_with(block3.hash), [block3.hash, block.hash])
         self.assertEqual(self.test_chain.get_chain_ending_with(block4.hash), [block4.hash, block2.hash, block.hash])
 
+    def test_pow_is_ancestor(self):
+        blocks = [TestBlock(0, [], "genesis", is_genesis=True)]
+        self.assertTrue(self.test_chain.add_block(blocks[0]))
+        for height in range(1, 20):
+            blocks.append(TestBlock(height, [], blocks[-1].hash))
+            self.assertTrue(self.test_chain.add_block(blocks[-1]))
+        fork = TestBlock(6, [], blocks[5].hash)
+        fork.set_seal_data(5) # change seal data to enforce that fork differs from the main chain
+        self.assertTrue(self.test_chain.add_block(fork))
+        fork2 = TestBlock(7, [], fork.hash)
+        self.assertTrue(self.test_chain.add_block(fork2))
+
+        self.assertEqual(self.test_chain.skip_pointers[blocks[12].hash], [blocks[11].hash, blocks[10].hash, blocks[8].hash, blocks[4].hash])
+        for block in blocks:
+            self.assertTrue(self.test_chain.is_ancestor(block.hash, blocks[-1].hash))
+            self.assertEqual(self.test_chain.get_ancestor(blocks[-1].hash, block.height), block.hash)
+        self.assertTrue(self.test_chain.is_ancestor(blocks[5].hash, fork2.hash))
+        self.assertFalse(self.test_chain.is_ancestor(blocks[6].hash, fork2.hash))
+        self.assertFalse(self.test_chain.is_ancestor(fork.hash, blocks[-1].hash))
+        self.assertFalse(self.test_chain.is_ancestor(blocks[-1].hash, blocks[3].hash))
+        self.assertFalse(self.test_chain.is_ancestor("test", blocks[3].hash))
+        self.assertEqual(self.test_chain.get_common_ancestor(fork2.hash, blocks[-1].hash), blocks[5].hash)
+        self.assertEqual(self.test_chain.get_common_ancestor(blocks[9].hash, blocks[17].hash), blocks[9].hash)
+        self.assertEqual(self.test_chain.get_common_ancestor(fork.hash, fork2.hash), fork.hash)
+
+    def test_pow_add_blocks(self):
+        # PoW blocks look up their parent's target when created, so build them on a scratch chain
+        blocks = [TestBlock(0, [], "genesis", is_genesis=True)]
+        self.assertTrue(self.test_chain.add_block(blocks[0]))
+        for height in range(1, 10):
+            blocks.append(TestBlock(height, [], blocks[-1].hash))
+            self.assertTrue(self.test_chain.add_block(blocks[-1]))
+        fork = TestBlock(4, [], blocks[3].hash)
+        fork.set_seal_data(5) # change seal data to enforce that fork differs from the main chain
+        bad_height = TestBlock(7, [], blocks[3].hash)
+        self.test_chain = blockchain.Blockchain()
+        blockchain.chain = self.test_chain
+
+        # children before parents, a duplicate and an invalid block
+        to_add = [fork, bad_height] + blocks[::-1] + [blocks[2]]
+        added = self.test_chain.add_blocks(to_add, commit_every=3)
+        self.assertEqual(added, [True, False] + [True] * len(blocks) + [False])
+        self.assertEqual(self.test_chain.block_count, len(blocks) + 1)
+        self.assertEqual(self.test_chain.get_chain_ending_with(blocks[-1].hash), [block.hash for block in blocks[::-1]])
+        self.assertEqual(self.test_chain.get_blockhashes_at_height(4), [blocks[4].hash, fork.hash]) # input order kept within a height
+        self.assertEqual(self.test_chain.get_heaviest_chain_tip().hash, blocks[-1].hash)
+
+    def test_pow_add_blocks_rollback(self):
+        blocks = [TestBlock(0, [], "genesis", is_genesis=True)]
+        self.assertTrue(self.test_chain.add_block(blocks[0]))
+        for height in range(1, 5):
+            blocks.append(TestBlock(height, [], blocks[-1].hash))
+            self.assertTrue(self.test_chain.add_block(blocks[-1]))
+        failing = FailingBlock(5, [], blocks[-1].hash)
+
+        # add_blocks commits and aborts, so the chain must live in a database (here in memory)
+        db = ZODB.DB(None)
+        connection = db.open()
+        try:
+            self.test_chain = connection.root.blockchain = blockchain.Blockchain()
+            blockchain.chain = self.test_chain
+            transaction.commit()
+            with self.assertRaises(RuntimeError):
+                self.test_chain.add_blocks(blocks + [failing], commit_every=3)
+
+            # the first batch stays committed, the rest of the failing batch is rolled back from every index
+            self.assertEqual(self.test_chain.block_count, 3)
+            self.assertEqual(list(self.test_chain.blocks.keys()), sorted(block.hash for block in blocks[:3]))
+            self.assertEqual(self.test_chain.get_heights_with_blocks(), [0, 1, 2])
+            self.assertEqual(set(self.test_chain.total_weights.keys()), set(block.hash for block in blocks[:3]))
+            self.assertEqual(self.test_chain.get_best_chain(), [block.hash for block in blocks[2::-1]])
+            self.assertEqual(self.test_chain.heaviest_tip, blocks[2].hash)
+            self.assertEqual(self.test_chain.utxo_tip, blocks[2].hash)
+            self.assertEqual(self.test_chain.get_verdict(blocks[3].hash), None)
+
+            # and the remaining blocks can be added again
+            self.assertEqual(self.test_chain.add_blocks(blocks), [False] * 3 + [True] * 2)
+            self.assertEqual(self.test_chain.heaviest_tip, blocks[4].hash)
+        finally:
+            transaction.abort()
+            connection.close()
+            db.close()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,7 @@
 import os
 import sys
 import unittest
-from blockchain.util import sha256_2_string
+from blockchain.util import sha256_2_string, sha256_midstate, sha256_2_from_midstate, sha256_2_nonce_batch
 from blockchain.pow_block import PoWBlock
 from blockchain.transaction import Transaction, TransactionOutput
 
@@ -32,6 +32,32 @@ class HashTest(unittest.TestCase):
         block = TestBlock(0, [tx1,tx2], "genesis", is_genesis=True, include_merkle_root=False)
         block.set_dummy_timestamp()
         self.assertEqual(sha256_2_string(block.header()), "9fc4ae4f2e6a68a0e79a57c4491b03a72f9a4bcdbc6ab7213e0f9334d800c57d")
+        self.assertEqual(block.calculate_hash(), "9fc4ae4f2e6a68a0e79a57c4491b03a72f9a4bcdbc6ab7213e0f9334d800c57d")
+
+    def test_cached_hash_invalidation(self):
+        tx1 = Transaction([], [TransactionOutput("Alice", "Bob", 1), TransactionOutput("Alice", "Alice", 1)])
+        tx2 = Transaction([tx1.hash + ":0"], [TransactionOutput("Alice", "Bob", 1), TransactionOutput("Alice", "Carol", 1)])
+        block = TestBlock(0, [tx1], "genesis", is_genesis=True)
+        block.set_dummy_timestamp()
+        self.assertEqual(block.calculate_hash(), sha256_2_string(block.header()))
+        block.set_seal_data(7)
+        self.assertEqual(block.hash, sha256_2_string(block.header()))
+        block.height = 1
+        self.assertEqual(block.calculate_hash(), sha256_2_string(block.header()))
+        self.assertNotEqual(block.calculate_hash(), block.hash)
+        merkle = block.calculate_merkle_root()
+        block.transactions = [tx1, tx2]
+        self.assertNotEqual(block.calculate_merkle_root(), merkle)
+        block.transactions.pop()
+        self.assertEqual(block.calculate_merkle_root(), merkle)
+
+    def test_midstate_hash(self):
+        midstate = sha256_midstate("Data ")
+        self.assertEqual(sha256_2_from_midstate(midstate, "test"), "95cb8ec3a627b3b25902c7d38ca7e51a3d54ad99df0302e93e899337b8e73b2e")
+        self.assertEqual(sha256_2_from_midstate(midstate, "test 2"), "bd069191dbc430b9627617c4480a5ec6d25106ad278de785509510ab2f5b2eff")
+        self.assertEqual(sha256_2_from_midstate(sha256_midstate(""), ""), sha256_2_string(""))
+        batch = sha256_2_nonce_batch(sha256_midstate("header`"), 98, 5)
+        self.assertEqual(batch, [int(sha256_2_string("header`" + str(nonce)), 16) for nonce in range(98, 103)])
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import blockchain
+from blockchain.pow_block import PoWBlock
+from blockchain.transaction import Transaction, TransactionOutput
+from blockchain.mempool import Mempool
+
+class TestBlock(PoWBlock):
+    """ We want to test PoW blocks without mining, so override seal check """
+
+    def seal_is_valid(self):
+        return True
+
+    def calculate_appropriate_target(self):
+        return int(2 ** 256)
+
+class MempoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.test_chain = blockchain.Blockchain()
+        self.old_chain = blockchain.chain # blocks are validated against the global DB blockchain, so shadow it w our test chain
+        blockchain.chain = self.test_chain
+
+    def tearDown(self):
+        blockchain.chain = self.old_chain # restore original chain
+
+    def test_mempool(self):
+        tx0 = Transaction([], [TransactionOutput("Genesis", "Alice", 10), TransactionOutput("Genesis", "Alice", 10)])
+        genesis = TestBlock(0, [tx0], "genesis", is_genesis=True)
+        self.assertTrue(self.test_chain.add_block(genesis))
+        mempool = Mempool(self.test_chain, genesis.hash)
+
+        tx1 = Transaction([tx0.hash + ":0"], [TransactionOutput("Alice", "Bob", 4), TransactionOutput("Alice", "Alice", 5)]) # fee 1
+        tx2 = Transaction([tx1.hash + ":0"], [TransactionOutput("Bob", "Carol", 4)]) # spends a pooled transaction
+        tx3 = Transaction([tx0.hash + ":0"], [TransactionOutput("Alice", "Carol", 10)]) # conflicts with tx1
+        tx4 = Transaction([tx0.hash + ":1"], [TransactionOutput("Alice", "Dave", 7)]) # fee 3
+        self.assertTrue(mempool.add(tx1))
+        self.assertTrue(mempool.add(tx2))
+        self.assertFalse(mempool.add(tx3))
+        self.assertFalse(mempool.add(tx1))
+        self.assertFalse(mempool.add(Transaction([tx0.hash + ":5"], [TransactionOutput("Alice", "Bob", 1)]))) # no such output
+        self.assertFalse(mempool.add(Transaction([tx1.hash + ":1"], [TransactionOutput("Bob", "Bob", 1)]))) # not Bob's
+        self.assertTrue(mempool.add(tx4))
+        self.assertFalse(mempool.is_spendable(tx0.hash + ":0"))
+        self.assertTrue(mempool.is_spendable(tx1.hash + ":1"))
+
+        # highest fee first, children after their parents
+        self.assertEqual(mempool.build_template(), [tx4, tx1, tx2])
+        self.assertEqual(mempool.build_template(max_txs=2), [tx4, tx1])
+        block1 = TestBlock(1, mempool.build_template(), genesis.hash)
+        self.assertTrue(self.test_chain.add_block(block1))
+
+        # included transactions leave the pool when the tip moves
+        mempool.set_tip(block1.hash)
+        self.assertEqual(len(mempool), 0)
+        tx5 = Transaction([tx2.hash + ":0"], [TransactionOutput("Carol", "Alice", 4)])
+        self.assertTrue(mempool.add(tx5))
+
+        # on a reorg, transactions of the abandoned blocks come back unless they conflict with the new chain
+        fork = TestBlock(1, [tx3], genesis.hash)
+        self.assertTrue(self.test_chain.add_block(fork))
+        mempool.set_tip(fork.hash)
+        self.assertEqual(mempool.build_template(), [tx4])
+        self.assertNotIn(tx5.hash, mempool)
+        mempool.set_tip(block1.hash)
+        self.assertEqual(len(mempool), 0)
+        mempool.set_tip(genesis.hash)
+        self.assertEqual(mempool.build_template(), [tx4, tx1, tx2])
+
+    def test_mempool_multiple_inputs_from_one_parent(self):
+        tx0 = Transaction([], [TransactionOutput("Genesis", "Alice", 10), TransactionOutput("Genesis", "Alice", 10)])
+        genesis = TestBlock(0, [tx0], "genesis", is_genesis=True)
+        self.assertTrue(self.test_chain.add_block(genesis))
+        mempool = Mempool(self.test_chain, genesis.hash)
+
+        tx1 = Transaction([tx0.hash + ":0", tx0.hash + ":1"], [TransactionOutput("Alice", "Bob", 20)]) # spends both outputs
+        tx2 = Transaction([tx1.hash + ":0"], [TransactionOutput("Bob", "Carol", 20)])
+        self.assertTrue(mempool.add(tx1))
+        self.assertTrue(mempool.add(tx2))
+        block1 = TestBlock(1, [tx1], genesis.hash)
+        self.assertTrue(self.test_chain.add_block(block1))
+
+        mempool.set_tip(block1.hash)
+        self.assertEqual(mempool.build_template(), [tx2])
+        self.assertEqual(mempool.dependents, {tx1.hash: set([tx2.hash])})
+        mempool.set_tip(genesis.hash)
+        self.assertEqual(mempool.build_template(), [tx1, tx2])
+
+
+if __name__ == '__main__':
+    unittest.main()
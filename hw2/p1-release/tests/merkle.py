@@ -1,4 +1,7 @@
 import unittest
+from math import ceil, log2
+from blockchain.util import sha256_2_string
+from blockchain.merkle import MerkleTree, verify_merkle_proof
 from blockchain.pow_block import PoWBlock
 from blockchain.transaction import Transaction, TransactionOutput
 
@@ -8,6 +11,16 @@ class TestBlock(PoWBlock):
     def set_dummy_timestamp(self):
         self.timestamp = ""
 
+def reference_merkle_root(transactions):
+    """ Straightforward full-tree Merkle root, for checking MerkleTree against. """
+    if len(transactions) == 0:
+        return sha256_2_string("")
+    nodes = [sha256_2_string(str(tx)) for tx in transactions]
+    nodes += [sha256_2_string("")] * ((1 << ceil(log2(len(nodes)))) - len(nodes))
+    while len(nodes) > 1:
+        nodes = [sha256_2_string(nodes[i] + nodes[i + 1]) for i in range(0, len(nodes), 2)]
+    return nodes[0]
+
 class MerkleRootTest(unittest.TestCase):
 
     def test_merkle_root(self):
@@ -27,5 +40,35 @@ class MerkleRootTest(unittest.TestCase):
         self.assertEqual(block2.merkle, "e0559c662f64c8fd1b638384ecbb1104335445a07114fd7d197316402e2f6f4c")
         self.assertEqual(block3.merkle, "039eceb401b485400f19bca99158b9dd2fcd13e9e4f287fde16f81fa58074a51")
 
+    def test_merkle_tree_incremental_and_proofs(self):
+        txs = [Transaction([], [TransactionOutput("Alice", "Bob", i)]) for i in range(13)]
+        incremental = MerkleTree()
+        for n in range(len(txs) + 1):
+            tree = MerkleTree(txs[:n])
+            self.assertEqual(tree.root(), reference_merkle_root(txs[:n]))
+            self.assertEqual(incremental.root(), tree.root())
+            self.assertEqual(incremental.levels, tree.levels)
+            for i in range(n):
+                proof = tree.get_proof(i)
+                self.assertTrue(verify_merkle_proof(sha256_2_string(str(txs[i])), i, proof, tree.root()))
+                self.assertFalse(verify_merkle_proof(sha256_2_string(str(txs[i])), i ^ 1, proof, tree.root()))
+                self.assertFalse(verify_merkle_proof(sha256_2_string(""), i, proof, tree.root()))
+            if n < len(txs):
+                incremental.append(txs[n])
+
+    def test_block_merkle_template(self):
+        txs = [Transaction([], [TransactionOutput("Alice", "Bob", i)]) for i in range(5)]
+        block = TestBlock(0, txs[:2], "genesis", is_genesis=True)
+        block.transactions.extend(txs[2:])
+        self.assertEqual(block.calculate_merkle_root(), reference_merkle_root(txs))
+        self.assertEqual(len(block.get_merkle_proof(4)), 3)
+
+        # replaced or removed in place, without invalidate_caches
+        block.transactions[1] = txs[0]
+        self.assertEqual(block.calculate_merkle_root(), reference_merkle_root([txs[0], txs[0]] + txs[2:]))
+        block.transactions[1] = txs[1]
+        del block.transactions[3:]
+        self.assertEqual(block.calculate_merkle_root(), reference_merkle_root(txs[:3]))
+
 if __name__ == '__main__':
     unittest.main()
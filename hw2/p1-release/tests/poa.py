@@ -1,6 +1,9 @@
 import unittest
-from blockchain.util import sha256_2_string
-from blockchain.poa_block import PoABlock
+import binascii
+import config
+from blockchain import keys
+from blockchain.util import sha256_2_string, sign_message, is_message_signed
+from blockchain.poa_block import PoABlock, verify_seal
 from blockchain.transaction import Transaction, TransactionOutput
 
 class TestBlock(PoABlock):
@@ -9,6 +12,14 @@ class TestBlock(PoABlock):
     def force_set_seal_data(self, seal_data):
         self.seal_data = seal_data
 
+class NodeKeyBlock(TestBlock):
+    """ Sealed under node 1's key instead of the authority's """
+
+    def get_public_key(self):
+        return binascii.unhexlify(config.PUBLIC_KEYS[1])
+
+    def get_private_key(self):
+        return binascii.unhexlify(config.SECRET_KEYS[1])
 
 class PoATest(unittest.TestCase):
 
@@ -23,6 +34,43 @@ class PoATest(unittest.TestCase):
         block.force_set_seal_data(0)
         self.assertFalse(block.seal_is_valid())
 
+    def test_poa_verify_seals(self):
+        blocks = []
+        for height in range(20):
+            block = TestBlock(height, [], "genesis", is_genesis=True)
+            block.mine()
+            blocks.append(block)
+        blocks[3].force_set_seal_data(blocks[3].seal_data - 1)
+        blocks[7].force_set_seal_data(0)
+        expected = [block.seal_is_valid() for block in blocks]
+        self.assertEqual(expected.count(False), 2)
+        self.assertEqual(TestBlock.verify_seals(blocks, processes=2), expected)
+        self.assertEqual(TestBlock.verify_seals(blocks, processes=1), expected)
+        # remembered results are dropped once the seal changes
+        blocks[3].mine()
+        self.assertTrue(blocks[3].seal_is_valid())
+
+    def test_poa_block_keys(self):
+        blocks = []
+        for height in range(20):
+            block = NodeKeyBlock(height, [], "genesis", is_genesis=True)
+            block.mine()
+            blocks.append(block)
+        self.assertTrue(all(block.seal_is_valid() for block in blocks))
+        self.assertEqual(NodeKeyBlock.verify_seals(blocks, processes=2), [True] * 20) # workers check the block's own key
+        seal_data, unsealed_header, public_key = blocks[0].get_seal()
+        self.assertEqual(public_key, config.PUBLIC_KEYS[1])
+        self.assertFalse(verify_seal(seal_data, unsealed_header, config.AUTHORITY_PK))
+
+    def test_key_registry(self):
+        # config keys are parsed once, on import, and reused by every signing / verification path
+        self.assertIs(keys.get_signing_key(config.AUTHORITY_SK), keys.get_authority_signing_key())
+        self.assertIs(keys.get_verifying_key(config.PUBLIC_KEYS[1]), keys.get_node_verifying_key(1))
+        signature = sign_message("vote", config.SECRET_KEYS[1])
+        self.assertTrue(is_message_signed("vote", signature, config.PUBLIC_KEYS[1]))
+        self.assertFalse(is_message_signed("vote", signature, config.PUBLIC_KEYS[2]))
+        self.assertFalse(is_message_signed("other vote", signature, config.PUBLIC_KEYS[1]))
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,46 @@
+import unittest
+import multiprocessing
+from blockchain import pow_block
+from blockchain.pow_block import PoWBlock, search_nonce_range
+
+class TestBlock(PoWBlock):
+    """ We are testing mining, so use an easy target (about 1 in 2^14 hashes is a valid seal) and a fixed timestamp """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timestamp = 0 # so the initial seal (nonce 0) is known to be invalid
+        self.hash = self.calculate_hash()
+
+    def calculate_appropriate_target(self):
+        return int(2 ** 242)
+
+class PoWTest(unittest.TestCase):
+
+    def test_pow_mining(self):
+        block = TestBlock(0, [], "genesis", is_genesis=True)
+        self.assertFalse(block.seal_is_valid())
+        self.assertGreater(block.mine(), 0)
+        self.assertTrue(block.seal_is_valid())
+        self.assertTrue(type(block.seal_data) == int)
+        self.assertEqual(block.mine(), 0.0) # already sealed
+
+    def test_pow_parallel_mining(self):
+        for height in range(3):
+            block = TestBlock(height, [], "genesis", is_genesis=True)
+            self.assertFalse(block.seal_is_valid())
+            self.assertGreater(block.mine(processes=2), 0)
+            self.assertTrue(block.seal_is_valid())
+            self.assertTrue(pow_block.mining_stop_event.is_set()) # the other worker was told to stop
+
+    def test_pow_search_stops(self):
+        block = TestBlock(0, [], "genesis", is_genesis=True)
+        old_stop_event = pow_block.stop_event
+        pow_block.stop_event = multiprocessing.Event()
+        try:
+            pow_block.stop_event.set()
+            self.assertEqual(search_nonce_range(block.unsealed_header() + "`", block.target, 0, 1 << 20), (None, 0))
+        finally:
+            pow_block.stop_event = old_stop_event
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import unittest
+import blockchain
+from blockchain.pow_block import PoWBlock
+from blockchain.transaction import Transaction, TransactionOutput
+
+class TestBlock(PoWBlock):
+    """ We want to test PoW blocks without mining, so override seal check """
+
+    def seal_is_valid(self):
+        return True
+
+    def calculate_appropriate_target(self):
+        return int(2 ** 256)
+
+class UTXOTest(unittest.TestCase):
+
+    def setUp(self):
+        self.test_chain = blockchain.Blockchain()
+        self.old_chain = blockchain.chain # PoW chains need to look up difficulty in the db, so shadow the global DB blockchain w our test chain
+        blockchain.chain = self.test_chain
+
+    def tearDown(self):
+        blockchain.chain = self.old_chain # restore original chain
+
+    def test_utxo_view_linear_chain(self):
+        tx1 = Transaction([], [TransactionOutput("Alice", "Bob", 1), TransactionOutput("Alice", "Alice", 1)])
+        tx2 = Transaction([tx1.hash + ":1"], [TransactionOutput("Alice", "Bob", .5), TransactionOutput("Alice", "Alice", .5)])
+
+        block = TestBlock(0, [tx1], "genesis", is_genesis=True)
+        self.assertTrue(self.test_chain.add_block(block))
+        block2 = TestBlock(1, [tx2], block.hash)
+        self.assertTrue(self.test_chain.add_block(block2))
+        self.assertEqual(self.test_chain.utxo_tip, block2.hash)
+        self.assertEqual(set(self.test_chain.unspent_outputs), set([tx1.hash + ":0", tx2.hash + ":0", tx2.hash + ":1"]))
+        self.assertEqual(set(self.test_chain.included_txs), set([tx1.hash, tx2.hash]))
+
+        view = self.test_chain.get_utxo_view(block.hash)
+        self.assertTrue(view.is_unspent(tx1.hash + ":1"))
+        self.assertFalse(view.is_unspent(tx2.hash + ":0"))
+        self.assertFalse(view.has_transaction(tx2.hash))
+
+        view = self.test_chain.get_utxo_view("genesis")
+        self.assertFalse(view.has_transaction(tx1.hash))
+        self.assertFalse(view.is_unspent(tx1.hash + ":0"))
+
+    def test_utxo_view_forks(self):
+        tx1 = Transaction([], [TransactionOutput("Alice", "Bob", 1), TransactionOutput("Alice", "Alice", 1)])
+        tx2 = Transaction([tx1.hash + ":1"], [TransactionOutput("Alice", "Bob", .5), TransactionOutput("Alice", "Alice", .5)])
+        tx3 = Transaction([tx1.hash + ":1"], [TransactionOutput("Alice", "Carol", .5), TransactionOutput("Alice", "Alice", .5)])
+        tx4 = Transaction([tx2.hash + ":1"], [TransactionOutput("Alice", "Carol", .5)])
+
+        block = TestBlock(0, [tx1], "genesis", is_genesis=True)
+        self.assertTrue(self.test_chain.add_block(block))
+        block2 = TestBlock(1, [tx2], block.hash)
+        self.assertTrue(self.test_chain.add_block(block2))
+        block3 = TestBlock(2, [tx4], block2.hash)
+        self.assertTrue(self.test_chain.add_block(block3))
+
+        # fork off genesis, spending the same input as block2; the materialized state stays on the heavier chain
+        fork = TestBlock(1, [tx3], block.hash)
+        self.assertTrue(self.test_chain.add_block(fork))
+        self.assertEqual(self.test_chain.utxo_tip, block3.hash)
+        self.assertEqual(set(self.test_chain.unspent_outputs), set([tx1.hash + ":0", tx2.hash + ":0", tx4.hash + ":0"]))
+
+        # the fork sees its own state through a view
+        view = self.test_chain.get_utxo_view(fork.hash)
+        self.assertTrue(view.has_transaction(tx3.hash))
+        self.assertFalse(view.has_transaction(tx2.hash))
+        self.assertTrue(view.is_unspent(tx3.hash + ":0"))
+        self.assertFalse(view.is_unspent(tx2.hash + ":0"))
+
+        # and so does the main chain
+        view = self.test_chain.get_utxo_view(block3.hash)
+        self.assertTrue(view.has_transaction(tx4.hash))
+        self.assertFalse(view.has_transaction(tx3.hash))
+        self.assertFalse(view.is_unspent(tx2.hash + ":1"))
+        self.assertTrue(view.is_unspent(tx4.hash + ":0"))
+        self.assertFalse(view.is_unspent(tx3.hash + ":0"))
+
+        # and validation on either branch uses the right state
+        tx5 = Transaction([tx4.hash + ":0"], [TransactionOutput("Carol", "Carol", .5)])
+        self.assertTrue(TestBlock(3, [tx5], block3.hash).is_valid()[0])
+        self.assertEqual(TestBlock(2, [tx5], fork.hash).is_valid(), (False, "Input transaction not found"))
+        self.assertEqual(TestBlock(2, [tx2], fork.hash).is_valid(), (False, "Double-spent input"))
+
+    def test_reorg(self):
+        tx1 = Transaction([], [TransactionOutput("Alice", "Bob", 1), TransactionOutput("Alice", "Alice", 1)])
+        tx2 = Transaction([tx1.hash + ":1"], [TransactionOutput("Alice", "Bob", .5), TransactionOutput("Alice", "Alice", .5)])
+        tx3 = Transaction([tx1.hash + ":1"], [TransactionOutput("Alice", "Carol", .5), TransactionOutput("Alice", "Alice", .5)])
+
+        blocks = [TestBlock(0, [tx1], "genesis", is_genesis=True)]
+        self.assertTrue(self.test_chain.add_block(blocks[0]))
+        blocks.append(TestBlock(1, [tx2], blocks[0].hash))
+        self.assertTrue(self.test_chain.add_block(blocks[-1]))
+        for height in range(2, 5):
+            blocks.append(TestBlock(height, [], blocks[-1].hash))
+            self.assertTrue(self.test_chain.add_block(blocks[-1]))
+        self.assertEqual(self.test_chain.get_best_chain(), [block.hash for block in blocks[::-1]])
+
+        # a lighter fork leaves the active chain alone
+        forks = [TestBlock(1, [tx3], blocks[0].hash)]
+        self.assertTrue(self.test_chain.add_block(forks[0]))
+        for height in range(2, 6):
+            forks.append(TestBlock(height, [], forks[-1].hash))
+            forks[-1].set_seal_data(5) # differ from the main chain's empty blocks
+        for fork in forks[1:3]:
+            self.assertTrue(self.test_chain.add_block(fork))
+        self.assertEqual(self.test_chain.get_best_block_hash(4), blocks[4].hash)
+        self.assertFalse(self.test_chain.is_on_best_chain(forks[0].hash))
+
+        # once heavier, it replaces the blocks above the fork point
+        self.assertTrue(self.test_chain.add_block(forks[3]))
+        self.assertTrue(self.test_chain.add_block(forks[4]))
+        fork_tip = forks[4]
+        self.assertEqual(self.test_chain.get_best_chain(), [block.hash for block in forks[::-1]] + [blocks[0].hash])
+        self.assertEqual([self.test_chain.get_best_block_hash(height) for height in range(7)], [blocks[0].hash] + [block.hash for block in forks] + [None])
+        self.assertEqual(self.test_chain.get_best_chain(2, 3), [forks[2].hash, forks[1].hash]) # one page of the explorer
+        self.assertEqual(self.test_chain.get_heights_with_blocks(4, 9), [4, 5])
+        self.assertEqual(self.test_chain.get_max_height(), 5)
+        self.assertTrue(self.test_chain.is_on_best_chain(forks[0].hash))
+        self.assertFalse(self.test_chain.is_on_best_chain(blocks[1].hash))
+        self.assertEqual(self.test_chain.utxo_tip, fork_tip.hash)
+        self.assertEqual(set(self.test_chain.unspent_outputs), set([tx1.hash + ":0", tx3.hash + ":0", tx3.hash + ":1"]))
+        self.assertEqual(set(self.test_chain.included_txs), set([tx1.hash, tx3.hash]))
+
+        # going back reports what changed
+        disconnected, connected = self.test_chain.get_reorg_path(blocks[4].hash)
+        self.assertEqual(disconnected, forks[::-1])
+        self.assertEqual(connected, blocks[1:])
+        self.assertEqual(self.test_chain.get_path(forks[2].hash, blocks[3].hash), (forks[2::-1], blocks[1:4])) # between any two blocks
+        self.assertEqual(self.test_chain.get_path(blocks[2].hash, blocks[4].hash), ([], blocks[3:5]))
+        self.assertEqual(self.test_chain.get_path(None, blocks[1].hash), ([], blocks[:2]))
+
+    def test_ancestor_view_matches_overlay(self):
+        tx1 = Transaction([], [TransactionOutput("Alice", "Bob", 1), TransactionOutput("Alice", "Alice", 1)])
+        tx2 = Transaction([tx1.hash + ":1"], [TransactionOutput("Alice", "Bob", .5), TransactionOutput("Alice", "Alice", .5)])
+        tx3 = Transaction([tx1.hash + ":1"], [TransactionOutput("Alice", "Carol", .5), TransactionOutput("Alice", "Alice", .5)])
+
+        block = TestBlock(0, [tx1], "genesis", is_genesis=True)
+        self.assertTrue(self.test_chain.add_block(block))
+        block2 = TestBlock(1, [tx2], block.hash)
+        self.assertTrue(self.test_chain.add_block(block2))
+        fork = TestBlock(1, [tx3], block.hash)
+        self.assertTrue(self.test_chain.add_block(fork))
+
+        old_distance = blockchain.Blockchain.MAX_UTXO_VIEW_DISTANCE
+        blockchain.Blockchain.MAX_UTXO_VIEW_DISTANCE = 0
+        try:
+            ancestor_view = self.test_chain.get_utxo_view(block2.hash)
+        finally:
+            blockchain.Blockchain.MAX_UTXO_VIEW_DISTANCE = old_distance
+        overlay_view = self.test_chain.get_utxo_overlay(block2.hash)
+        self.assertNotEqual(type(ancestor_view), type(overlay_view))
+        for tx in [tx1, tx2, tx3]:
+            self.assertEqual(ancestor_view.has_transaction(tx.hash), overlay_view.has_transaction(tx.hash))
+            for i in range(3):
+                input_ref = tx.hash + ":" + str(i)
+                self.assertEqual(ancestor_view.is_unspent(input_ref), overlay_view.is_unspent(input_ref))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,7 @@ import blockchain
 import time
 from blockchain.util import sha256_2_string
 from blockchain.pow_block import PoWBlock
-from blockchain.transaction import Transaction, TransactionOutput
+from blockchain.transaction import Transaction, TransactionOutput, verify_hashes
 
 class TestBlock(PoWBlock):
     """ We want to test PoW blocks without mining, so override seal check """
@@ -80,6 +80,44 @@ class ValidityTest(unittest.TestCase):
         block2.hash = old_hash
         self.assertTrue(block2.is_valid()[0])
 
+    def test_rejects_invalid_claimed_tx_hash(self):
+        tx1 = Transaction([], [TransactionOutput("Alice", "Bob", 1), TransactionOutput("Alice", "Alice", 1)])
+        # transactions received with their hash are only hashed when a block including them is validated
+        trusted_tx = Transaction(tx1.input_refs, tx1.outputs, claimed_hash=tx1.hash)
+        forged_tx = Transaction(tx1.input_refs, tx1.outputs, claimed_hash="f" * 64)
+        self.assertEqual(trusted_tx._v_hash_valid, None)
+
+        block = TestBlock(0, [forged_tx], "genesis", is_genesis=True)
+        self.assertEqual(block.is_valid(), (False, "Transaction hash failed to match"))
+        block = TestBlock(0, [trusted_tx], "genesis", is_genesis=True)
+        self.assertTrue(block.is_valid()[0])
+        self.assertEqual(trusted_tx._v_hash_valid, True) # remembered for later validations
+
+    def test_verdict_cache(self):
+        tx1 = Transaction([], [TransactionOutput("Alice", "Bob", 1), TransactionOutput("Alice", "Alice", 1)])
+        block = TestBlock(0, [tx1], "genesis", is_genesis=True)
+        self.assertEqual(self.test_chain.get_verdict(block.hash), None)
+        self.assertEqual(self.test_chain.get_validity(block), (True, "All checks passed"))
+        self.assertTrue(self.test_chain.add_block(block))
+        self.assertEqual(self.test_chain.get_verdict(block.hash), (True, "All checks passed"))
+
+        # blocks in the chain are never validated again
+        block.is_valid = lambda: self.fail("is_valid called for a block in the chain")
+        self.assertEqual(self.test_chain.get_validity(block), (True, "All checks passed"))
+        block2 = TestBlock(1, [tx1], block.hash)
+        self.assertEqual(self.test_chain.get_validity(block2), (False, "Malformed transaction included"))
+        self.assertEqual(self.test_chain.get_verdict(block2.hash), None)
+
+    def test_verify_hashes(self):
+        txs = [Transaction([], [TransactionOutput("Alice", "Bob", i)]) for i in range(100)]
+        received = [Transaction(tx.input_refs, tx.outputs, claimed_hash=tx.hash) for tx in txs]
+        self.assertTrue(verify_hashes(received))
+        self.assertTrue(all(tx._v_hash_valid for tx in received)) # results are remembered
+        received = [Transaction(tx.input_refs, tx.outputs, claimed_hash=tx.hash) for tx in txs]
+        received[-1].hash = txs[0].hash
+        self.assertFalse(verify_hashes(received))
+        self.assertEqual([tx._v_hash_valid for tx in received], [True] * (len(txs) - 1) + [False])
+
 
     def test_rejects_too_many_txs(self):
         txs = []
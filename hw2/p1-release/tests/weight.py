@@ -1,4 +1,5 @@
 import unittest
+import blockchain
 from blockchain.util import sha256_2_string
 from blockchain.pow_block import PoWBlock
 from blockchain.transaction import Transaction, TransactionOutput
@@ -9,6 +10,16 @@ class TestBlock(PoWBlock):
     def set_target(self, target):
         self.target = target
 
+class SealedTestBlock(TestBlock):
+    """ We want to add blocks without mining, so override seal check """
+
+    def seal_is_valid(self):
+        return True
+
+    def set_target(self, target):
+        self.target = target
+        self.hash = self.calculate_hash()
+
 class WeightTest(unittest.TestCase):
 
     def test_pow_weights(self):
@@ -25,6 +36,39 @@ class WeightTest(unittest.TestCase):
         block.set_target(2 ** 257)
         self.assertEqual(block.get_weight(), 0)
 
+    def test_heaviest_chain_tips(self):
+        test_chain = blockchain.Blockchain()
+        old_chain = blockchain.chain # PoW chains need to look up difficulty in the db, so shadow the global DB blockchain w our test chain
+        blockchain.chain = test_chain
+        try:
+            block = SealedTestBlock(0, [], "genesis", is_genesis=True)
+            self.assertTrue(test_chain.add_block(block))
+            block2 = SealedTestBlock(1, [], block.hash)
+            self.assertTrue(test_chain.add_block(block2))
+            heavy_fork = SealedTestBlock(1, [], block.hash)
+            heavy_fork.set_target(2 ** 246) # weight 1024, outweighing block2 + a child
+            heavy_fork.set_seal_data(5)
+            self.assertTrue(test_chain.add_block(heavy_fork))
+            block3 = SealedTestBlock(2, [], block2.hash)
+            self.assertTrue(test_chain.add_block(block3))
+
+            self.assertEqual(test_chain.get_all_block_weights(), {block.hash: 256, block2.hash: 512, heavy_fork.hash: 1280, block3.hash: 768})
+            self.assertEqual(test_chain.get_heaviest_chain_tip().hash, heavy_fork.hash)
+            self.assertEqual([tip.hash for tip in test_chain.get_top_k_tips(5)], [heavy_fork.hash, block3.hash])
+            self.assertEqual([tip.hash for tip in test_chain.get_top_k_tips(1)], [heavy_fork.hash])
+
+            # equal total weight at equal height: the newer block wins, like a full scan would pick
+            block3_fork = SealedTestBlock(2, [], block2.hash)
+            block3_fork.set_seal_data(5)
+            self.assertTrue(test_chain.add_block(block3_fork))
+            block4 = SealedTestBlock(3, [], block3.hash)
+            block4.set_target(2 ** 247) # weight 512, tying heavy_fork
+            self.assertTrue(test_chain.add_block(block4))
+            self.assertEqual(test_chain.get_heaviest_chain_tip().hash, heavy_fork.hash)
+            self.assertEqual([tip.hash for tip in test_chain.get_top_k_tips(5)], [heavy_fork.hash, block4.hash, block3_fork.hash])
+        finally:
+            blockchain.chain = old_chain # restore original chain
+
 if __name__ == '__main__':
     unittest.main()
 
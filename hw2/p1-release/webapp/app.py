@@ -1,35 +1,173 @@
 import config
 import ZODB, ZODB.FileStorage
+from ZODB.FileStorage.FileStorage import read_index
 import transaction
-import importlib
-from flask import Flask, render_template
+import blockchain
+import os
+import threading
+from contextlib import contextmanager
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 app = Flask(__name__)
 
-def get_all_blockhashes(chain):
+# Blocks are written by another process (eg add_random_pow_blockchain.py), which needs the
+# database lock; release the one taken when importing blockchain, and read through get_read_db.
+blockchain.connection.close()
+blockchain.db.close()
+
+class ChangedRecords(dict):
+    """ Transaction index for read_index (oid to record position) remembering every oid it was given. """
+
+    def __init__(self):
+        super().__init__()
+        self.oids = set()
+
+    def __setitem__(self, oid, pos):
+        self.oids.add(oid)
+        super().__setitem__(oid, pos)
+
+class FollowerFileStorage(ZODB.FileStorage.FileStorage):
+
+    def __init__(self, file_name):
+        """ A read-only FileStorage that follows the commits another process appends to its file.
+
+        A FileStorage only indexes its file when opened, so commits made by another process stay
+        invisible. Each sync() (run by Connection.sync, ie when a connection starts a transaction)
+        indexes the transactions appended since the previous one and invalidates the objects they
+        changed, so connections drop only those from their caches. A transaction still being
+        written is skipped until the next sync. Opened read-only, the storage takes no lock and the
+        writer keeps running; if the file is packed or replaced, restart the explorer.
+
+        Args:
+            file_name (str): Path of the FileStorage file.
+
+        Attributes:
+            followed_db (:obj:`MVCCAdapter`): The database's adapter, notified of changed objects (set by registerDB).
+        """
+        super().__init__(file_name, read_only=True)
+        self.followed_db = None
+
+    def registerDB(self, db):
+        self.followed_db = db
+
+    def sync(self):
+        """ Indexes the transactions appended to the file since the last call. """
+        with self._lock:
+            if os.path.getsize(self._file_name) == self._pos:
+                return
+            changed = ChangedRecords()
+            pos, oid, ltid = read_index(
+                self._file, self._file_name, self._index, changed,
+                ltid=self._ltid, start=self._pos, read_only=True)
+            if pos == self._pos:
+                return
+            self._pos, self._oid, self._ltid = pos, oid, ltid
+            if self.followed_db is not None:
+                self.followed_db.invalidate(ltid, changed.oids)
+
+# read-only database over the chain file, created by the first request
+read_db = None
+read_db_lock = threading.Lock()
+
+def get_read_db():
+    """ Returns the read-only database over config.DB_PATH (see FollowerFileStorage), opening it on first use. """
+    global read_db
+    with read_db_lock:
+        if read_db is None:
+            read_db = ZODB.DB(FollowerFileStorage(config.DB_PATH))
+        return read_db
+
+@contextmanager
+def open_chain():
+    """ Borrow a connection from the read-only database's pool for the duration of one request.
+
+    Each request gets its own connection and transaction manager, so requests run concurrently;
+    sync() picks up what the writer committed since (see FollowerFileStorage), and the objects
+    already loaded and not changed since (with their cached headers and Merkle trees) are reused
+    from the connection's cache.
+
+    Yields:
+        (:obj:`Blockchain`): the blockchain as of the latest commit.
+    """
+    connection = get_read_db().open(transaction_manager=transaction.TransactionManager())
+    try:
+        connection.sync()
+        yield connection.root.blockchain
+    finally:
+        connection.transaction_manager.abort() # the explorer never writes
+        connection.close()
+
+#: Heights shown per explorer page, unless a limit is requested
+BLOCKS_PER_PAGE = 50
+
+#: Maximum heights per explorer page or /blocks query
+MAX_BLOCKS_PER_PAGE = 500
+
+#: Heights loaded per step of a streamed export; the connection's cache is trimmed between steps
+EXPORT_BATCH_HEIGHTS = 100
+
+def get_all_blockhashes(chain, min_height=None, max_height=None):
     block_hashes = []
-    for height in chain.get_heights_with_blocks():
+    for height in chain.get_heights_with_blocks(min_height, max_height):
         for block_hash in chain.get_blockhashes_at_height(height):
             block_hashes.append(block_hash)
     block_hashes.reverse() # show newest block first
     return block_hashes
 
-def get_best_chain_blockhashes(chain):
-    return chain.get_chain_ending_with(chain.get_heaviest_chain_tip().hash)
+def get_best_chain_blockhashes(chain, min_height=None, max_height=None):
+    return chain.get_best_chain(min_height, max_height)
 
-def render_chain(block_hashes_function):
-    import blockchain
-    blockchain.connection.close()
-    blockchain.db.close()
-    importlib.reload(blockchain)
-    chain = blockchain.chain
+def get_page_range(chain):
+    """ Read the page requested with ?from_height=&limit= (limit heights, from from_height down).
 
-    block_hashes = block_hashes_function(chain)
+    Args:
+        chain (:obj:`Blockchain`): Blockchain being explored.
 
-    weights=chain.get_all_block_weights()
-    output = render_template('chain.html', block_hashes=block_hashes, chain=chain, weights=weights)
-    blockchain.connection.close()
-    blockchain.db.close()
-    return output
+    Returns:
+        (int, int, int): Lowest and highest height of the page, and the number of heights per page.
+    """
+    limit = min(max(request.args.get("limit", BLOCKS_PER_PAGE, type=int), 1), MAX_BLOCKS_PER_PAGE)
+    max_height = request.args.get("from_height", type=int)
+    if max_height is None:
+        max_height = chain.get_max_height() # newest page first
+    # keep the range within the chain (and within the integer keys of its indexes)
+    max_height = max(min(max_height, chain.get_max_height()), -1)
+    return max(max_height - limit + 1, 0), max_height, limit
+
+def get_block_summary(chain, block):
+    """ Describe a block for the JSON API, without its transactions (see get_tx_details). """
+    return {
+        "hash": block.hash,
+        "height": block.height,
+        "parent_hash": block.parent_hash,
+        "is_genesis": block.is_genesis,
+        "timestamp": block.timestamp,
+        "merkle": block.merkle,
+        "seal_data": block.seal_data,
+        "transactions": len(block.transactions),
+        "valid": chain.get_validity(block),
+        "weight": block.get_weight(),
+        "total_weight": chain.total_weights[block.hash],
+    }
+
+def get_tx_details(tx):
+    """ Describe a transaction for the JSON API. """
+    return {
+        "hash": tx.hash,
+        "input_refs": list(tx.input_refs),
+        "outputs": [{"sender": output.sender, "receiver": output.receiver, "amount": output.amount} for output in tx.outputs],
+    }
+
+def render_chain(block_hashes_function):
+    with open_chain() as chain:
+        min_height, max_height, limit = get_page_range(chain)
+        block_hashes = block_hashes_function(chain, min_height, max_height)
+
+        # only the page's blocks are loaded; their transactions are fetched when toggled (see block_transactions_view)
+        weights = {block_hash: chain.total_weights[block_hash] for block_hash in block_hashes}
+        newer_from = max_height + limit if max_height < chain.get_max_height() else None
+        older_from = min_height - 1 if min_height > 0 else None
+        return render_template('chain.html', block_hashes=block_hashes, chain=chain, weights=weights,
+                               limit=limit, newer_from=newer_from, older_from=older_from)
 
 @app.route('/')
 def full_chain_view():
@@ -38,3 +176,39 @@ def full_chain_view():
 @app.route('/best')
 def best_chain_view():
     return render_chain(get_best_chain_blockhashes)
+
+@app.route('/blocks')
+def blocks_view():
+    """ JSON range query over the blocks (?from_height=&limit=, and best=1 for the best chain only), newest first. """
+    block_hashes_function = get_best_chain_blockhashes if request.args.get("best") else get_all_blockhashes
+    with open_chain() as chain:
+        min_height, max_height, limit = get_page_range(chain)
+        blocks = [get_block_summary(chain, chain.blocks[block_hash]) for block_hash in block_hashes_function(chain, min_height, max_height)]
+    return jsonify({"from_height": max_height, "limit": limit, "blocks": blocks})
+
+@app.route('/block/<string:block_hash>/transactions')
+def block_transactions_view(block_hash):
+    with open_chain() as chain:
+        if block_hash not in chain.blocks:
+            return jsonify({"error": "Unknown block"}), 404
+        transactions = [get_tx_details(tx) for tx in chain.blocks[block_hash].transactions]
+    return jsonify({"block_hash": block_hash, "transactions": transactions})
+
+@app.route('/export')
+def export_view():
+    """ Stream every block (or the best chain only, with ?best=1) as one repr(block) per line, lowest height first.
+
+    Blocks are read EXPORT_BATCH_HEIGHTS heights at a time and written out as they are read, so
+    exporting a long chain never holds it in memory, on the server or in the response.
+    """
+    block_hashes_function = get_best_chain_blockhashes if request.args.get("best") else get_all_blockhashes
+
+    def generate():
+        with open_chain() as chain:
+            for min_height in range(0, chain.get_max_height() + 1, EXPORT_BATCH_HEIGHTS):
+                block_hashes = block_hashes_function(chain, min_height, min_height + EXPORT_BATCH_HEIGHTS - 1)
+                for block_hash in reversed(block_hashes): # parents before children
+                    yield repr(chain.blocks[block_hash]) + "\n"
+                chain._p_jar.cacheGC() # let the blocks already sent leave the connection's cache
+
+    return Response(stream_with_context(generate()), mimetype="text/plain")
@@ -1,11 +1,14 @@
-from abc import ABC, abstractmethod
-from collections import defaultdict # We want to make Block an abstract class; either a PoW or PoA block
+from abc import ABC, abstractmethod # We want to make Block an abstract class; either a PoW or PoA block
 import blockchain
-from blockchain.util import sha256_2_string, encode_as_str
+from blockchain.util import sha256_2_string, encode_as_str, sha256_midstate, sha256_2_from_midstate
 import time
 import persistent
-from blockchain.util import nonempty_intersection
-from math import log2, ceil
+from blockchain.merkle import MerkleTree
+from blockchain.transaction import verify_hashes
+from blockchain.encoding import FORMAT_VERSION, write_varint, write_signed_varint, write_float, write_hash, write_str
+
+#: Attributes serialized by unsealed_header(); changing any of them invalidates the cached header and hash
+HEADER_FIELDS = ("height", "timestamp", "target", "parent_hash", "is_genesis", "merkle")
 
 class Block(ABC, persistent.Persistent):
 
@@ -44,41 +47,72 @@ class Block(ABC, persistent.Persistent):
             self.merkle = self.calculate_merkle_root()
         self.hash = self.calculate_hash() # keep track of hash for caching purposes
 
+    def __setattr__(self, name, value):
+        """ Sets an attribute, dropping any cached value computed from it.
+
+        Caches live in volatile (_v_) attributes, so ZODB neither stores them nor marks the
+        block as changed when they are filled, and drops them whenever the block is reloaded.
+        """
+        super().__setattr__(name, value)
+        if name in HEADER_FIELDS:
+            self._v_unsealed_header = None
+            self._v_header_midstate = None
+            self._v_calculated_hash = None
+        elif name == "seal_data":
+            self._v_calculated_hash = None
+        elif name == "transactions":
+            self._v_merkle_tree = None
+
+    def invalidate_caches(self):
+        """ Drops all cached header, hash and Merkle values. """
+        self._v_unsealed_header = None
+        self._v_header_midstate = None
+        self._v_calculated_hash = None
+        self._v_merkle_tree = None
+
+    def get_merkle_tree(self):
+        """ Gets the Merkle tree of the block's transactions, cached until transactions change.
+
+        The cache keeps the hashes of the transactions it was built from and is reused only while
+        they are a prefix of the current ones, so any in-place change (a transaction replaced or
+        removed) rebuilds the tree, while transactions appended in place (eg while filling a block
+        template) are added to the cached tree incrementally.
+
+        Returns:
+            (:obj:`MerkleTree`): tree over self.transactions, with all levels kept for proofs.
+        """
+        cached = getattr(self, "_v_merkle_tree", None)
+        tx_hashes = [tx.hash for tx in self.transactions]
+        if cached is None or cached[0] != tx_hashes[:len(cached[0])]:
+            cached = (tx_hashes, MerkleTree(self.transactions))
+            self._v_merkle_tree = cached
+        leaf_hashes, merkle_tree = cached
+        for tx in self.transactions[len(leaf_hashes):]:
+            merkle_tree.append(tx)
+            leaf_hashes.append(tx.hash)
+        return merkle_tree
+
     def calculate_merkle_root(self):
         """ Gets the Merkle root hash for a given list of transactions.
 
-        This method is incomplete!  Right now, it only hashes the
-        transactions together, which does not enable the same type
-        of lite client support a true Merkle hash would.
-        You do not need to complete this except for the bonus question.
+        The tree (see MerkleTree) is what enables lite client support: any transaction can be
+        proven to be in the block with a logarithmic number of hashes (see get_merkle_proof).
 
         Returns:
             str: Merkle hash of the list of transactions in a block, uniquely identifying the list.
         """
+        return self.get_merkle_tree().root()
 
-        if len(self.transactions) == 0:
-            return sha256_2_string("")
-        elif len(self.transactions) == 1:
-            return sha256_2_string(str(self.transactions[0]))
-        else:
-            total = len(self.transactions)
-            levels = 1 + ceil(log2(total))
-            treenodes = [None] * levels
-            for i in range(levels):
-                treenodes[i] = [None] * (1 << i)
-
-            level = levels - 1
-            for i in range(1 << level):
-                if i < len(self.transactions):
-                    treenodes[level][i] = sha256_2_string(str(self.transactions[i]))
-                else:
-                    treenodes[level][i] = sha256_2_string("")
-            while level > 0:
-                level = level - 1
-                for i in range(1 << level):
-                    treenodes[level][i] = sha256_2_string(treenodes[level + 1][2*i] + treenodes[level + 1][2*i + 1])
+    def get_merkle_proof(self, tx_index):
+        """ Gets the Merkle inclusion proof of one of the block's transactions (see MerkleTree.get_proof).
+
+        Args:
+            tx_index (int): Position of the transaction in self.transactions.
 
-            return treenodes[0][0]
+        Returns:
+            (:obj:`list` of str): Hex-encoded sibling digests from the leaf level up to the root.
+        """
+        return self.get_merkle_tree().get_proof(tx_index)
 
     def unsealed_header(self):
         """ Computes the header string of a block (the component that is sealed by mining).
@@ -86,7 +120,11 @@ class Block(ABC, persistent.Persistent):
         Returns:
             str: String representation of the block header without the seal.
         """
-        return encode_as_str([self.height, self.timestamp, self.target, self.parent_hash, self.is_genesis, self.merkle], sep='`')
+        unsealed_header = getattr(self, "_v_unsealed_header", None)
+        if unsealed_header is None:
+            unsealed_header = encode_as_str([self.height, self.timestamp, self.target, self.parent_hash, self.is_genesis, self.merkle], sep='`')
+            self._v_unsealed_header = unsealed_header
+        return unsealed_header
 
     def header(self):
         """ Computes the full header string of a block after mining (includes the seal).
@@ -102,7 +140,16 @@ class Block(ABC, persistent.Persistent):
         Returns:
             str: SHA256^2 hash of self.header()
         """
-        return sha256_2_string(str(self.header()))
+        calculated_hash = getattr(self, "_v_calculated_hash", None)
+        if calculated_hash is None:
+            # same as hashing self.header(), split at the seal so resealing only hashes the new seal
+            midstate = getattr(self, "_v_header_midstate", None)
+            if midstate is None:
+                midstate = sha256_midstate(self.unsealed_header() + "`")
+                self._v_header_midstate = midstate
+            calculated_hash = sha256_2_from_midstate(midstate, str(self.seal_data))
+            self._v_calculated_hash = calculated_hash
+        return calculated_hash
 
     def __repr__(self):
         """ Get a full representation of a block as string, for debugging purposes; includes all transactions.
@@ -112,6 +159,52 @@ class Block(ABC, persistent.Persistent):
         """
         return encode_as_str([self.header(), "!".join([str(tx) for tx in self.transactions])], sep="`")
 
+    def encode(self, buf):
+        """ Appends the binary wire encoding of the block (see p2p.interfaces.block.bytes_to_block).
+
+        Layout: format version byte, flags byte (1: is_genesis, 2: float timestamp, 4: non-integer
+        seal data), height, timestamp, target, parent hash, Merkle root, seal data, then the number
+        of transactions and each transaction. Hashes travel as raw 32 bytes and integers as varints;
+        every field decodes to the value it had, so the decoded block has the same hash.
+
+        Args:
+            buf (bytearray): Buffer to append to.
+        """
+        flags = 0
+        if self.is_genesis:
+            flags |= 1
+        if isinstance(self.timestamp, float):
+            flags |= 2
+        if not isinstance(self.seal_data, int):
+            flags |= 4
+        buf.append(FORMAT_VERSION)
+        buf.append(flags)
+        write_varint(buf, self.height)
+        if flags & 2:
+            write_float(buf, self.timestamp)
+        else:
+            write_signed_varint(buf, self.timestamp)
+        write_varint(buf, self.target)
+        write_hash(buf, self.parent_hash)
+        write_hash(buf, self.merkle)
+        if flags & 4:
+            write_str(buf, str(self.seal_data))
+        else:
+            write_varint(buf, self.seal_data)
+        write_varint(buf, len(self.transactions))
+        for tx in self.transactions:
+            tx.encode(buf)
+
+    def to_bytes(self):
+        """ Get the binary wire encoding of the block, used to gossip blocks (see encode).
+
+        Returns:
+            bytes: Encoded block.
+        """
+        buf = bytearray()
+        self.encode(buf)
+        return bytes(buf)
+
     def set_seal_data(self, seal_data):
         """ Adds seal data to a block, recomputing the block's hash for its changed header representation.
         This method should never be called after a block is added to the blockchain!
@@ -132,7 +225,7 @@ class Block(ABC, persistent.Persistent):
             bool, str: True if block is valid, False otherwise plus an error or success message.
         """
 
-        chain = blockchain.chain # This object of type Blockchain may be useful
+        chain = blockchain.chaindb.chain # This object of type Blockchain may be useful
 
         # Placeholder for (1a)
 
@@ -151,6 +244,21 @@ class Block(ABC, persistent.Persistent):
         # On failure: return False, "Too many transactions"
         if len(self.transactions) > 900:
             return False, "Too many transactions"
+
+        # Pass 1: index the block's transactions and the input refs they spend, in one O(n) sweep
+        tx_indexes = {} # tx hash -> position of its first occurrence in the block
+        spenders = {} # input ref -> hashes of the transactions in the block spending it
+        for index, tx in enumerate(self.transactions):
+            tx_indexes.setdefault(tx.hash, index)
+            for input_ref in tx.input_refs:
+                spenders.setdefault(input_ref, set()).add(tx.hash)
+
+        # Pass 2: stateless per-transaction checks, which need nothing but the transaction itself
+        # Check that every transaction's hash (which may have been trusted from the network on decode) is correct
+        # On failure: return False, "Transaction hash failed to match"
+        if not verify_hashes(self.transactions):
+            return False, "Transaction hash failed to match"
+        all_txs_well_formed = all(tx.is_valid() for tx in self.transactions)
         
         # (checks that apply to genesis block)
         if self.is_genesis:
@@ -184,37 +292,24 @@ class Block(ABC, persistent.Persistent):
             return False, "Invalid seal"
         
 
-        # transaction validation 
-        for tx in self.transactions:
-            # Check that all transactions within are valid (use tx.is_valid) [test_malformed_txs]
-            # On failure: return False, "Malformed transaction included"
-            if not tx.is_valid():
-                return False, "Malformed transaction included"
-            
-        # settiing up set to add block hash in to check for duplication  
-        tx_hashes_in_block = set()
-        inputs_used_in_block = set()
+        # Check that all transactions within are valid (use tx.is_valid) [test_malformed_txs]
+        # On failure: return False, "Malformed transaction included"
+        if not all_txs_well_formed:
+            return False, "Malformed transaction included"
 
-        # for tx in self.transactions:
-        #     # add transactions to a block set to check for duplication
-        #     tx_hashes_in_block.add(tx.hash)
+        # Pass 3: contextual checks, in block order (a transaction may only use outputs of earlier ones)
+
+        # blocks on the chain this block extends (use parent block since a new block being validated wouldnt be in chain.blocks)
+        curr_chain = set(chain.get_chain_ending_with(self.parent_hash))
 
         # Check that for every transaction
-        for tx in self.transactions:
+        for index, tx in enumerate(self.transactions):
             # the transaction has not already been included on a block on the same blockchain as this block [test_double_tx_inclusion_same_chain]
             # (or twice in this block; you will have to check this manually) [test_double_tx_inclusion_same_block]
             # (you may find chain.get_chain_ending_with and chain.blocks_containing_tx and util.nonempty_intersection useful)
             # On failure: return False, "Double transaction inclusion"
-            # user parent block to validate since a new block being validated wouldnt be in chain.blocks
-            curr_chain = chain.get_chain_ending_with(self.parent_hash)
-            blocks_containing_tx = chain.blocks_containing_tx.get(tx.hash, None)
-            if blocks_containing_tx is None:
-                # check if in the same block
-                if tx.hash in tx_hashes_in_block:
-                    return False, "Double transaction inclusion"
-            else:
-                if nonempty_intersection(blocks_containing_tx, curr_chain):
-                    return False, "Double transaction inclusion"
+            if tx_indexes[tx.hash] < index or not curr_chain.isdisjoint(chain.blocks_containing_tx.get(tx.hash, [])):
+                return False, "Double transaction inclusion"
             
             # input validation setup
             input_sum = 0
@@ -228,60 +323,44 @@ class Block(ABC, persistent.Persistent):
                 # get each part of input ref
                 in_tx_hash = input_parts[0]
                 in_output_idx = int(input_parts[1])
+                # position of the input transaction if it is earlier in this block (None otherwise)
+                in_tx_index = tx_indexes.get(in_tx_hash)
+                if in_tx_index is not None and in_tx_index >= index:
+                    in_tx_index = None
 
                 # each input_ref is valid (aka corresponding transaction can be looked up in its holding transaction) [test_failed_input_lookup]
                 # (you may find chain.all_transactions useful here)
                 # On failure: return False, "Required output not found"
-                if in_tx_hash not in chain.all_transactions:
-                    # if not in current block then it is not valid
-                    if in_tx_hash not in tx_hashes_in_block:
-                        return False, "Required output not found"
+                if in_tx_hash in chain.all_transactions:
+                    input_tx = chain.all_transactions[in_tx_hash]
+                elif in_tx_index is not None:
+                    input_tx = self.transactions[in_tx_index]
                 else:
-                    if in_output_idx >= len(chain.all_transactions[in_tx_hash].outputs):
-                        return False, "Required output not found"
+                    return False, "Required output not found"
+                if in_output_idx >= len(input_tx.outputs):
+                    return False, "Required output not found"
                         
                 # user consistency check
                 # every input was sent to the same user (would normally carry a signature from this user; we leave this out for simplicity) [test_user_consistency]
                 # On failure: return False, "User inconsistencies"
-                if in_tx_hash in chain.all_transactions:
-                    input_tx = chain.all_transactions[in_tx_hash]
-                else:
-                    # If not in chain.all_transactions, must be in current block
-                    input_tx = next(tx for tx in self.transactions if tx.hash == in_tx_hash)
-                
                 if input_tx.outputs[in_output_idx].receiver != sender:
                     return False, "User inconsistencies"
                 
-                # check if input is already spent in blockchain
-                if input_ref in chain.blocks_spending_input:
-                    # no input_ref has been spent in a previous block on this chain [test_doublespent_input_same_chain]
-                    # (or in this block; you will have to check this manually) [test_doublespent_input_same_block]
-                    # (you may find nonempty_intersection and chain.blocks_spending_input helpful here)
-                    # On failure: return False, "Double-spent input"
-                    spending_blocks = chain.blocks_spending_input[input_ref]
-                    if nonempty_intersection(spending_blocks, curr_chain):
-                        return False, "Double-spent input"
-                for tx_in_same_block in self.transactions:
-                    if tx_in_same_block.hash != tx.hash:
-                        for tx_input_ref_in_same_block in tx_in_same_block.input_refs:
-                            if tx_input_ref_in_same_block == input_ref:
-                                return False, "Double-spent input"
+                # no input_ref has been spent in a previous block on this chain [test_doublespent_input_same_chain]
+                # (or in this block; you will have to check this manually) [test_doublespent_input_same_block]
+                # On failure: return False, "Double-spent input"
+                if not curr_chain.isdisjoint(chain.blocks_spending_input.get(input_ref, [])):
+                    return False, "Double-spent input"
+                if len(spenders[input_ref]) > 1: # spent by another transaction in this block
+                    return False, "Double-spent input"
 
                 # each input_ref points to a transaction on the same blockchain as this block [test_input_txs_on_chain]
                 # (or in this block; you will have to check this manually) [test_input_txs_in_block]
-                # (you may find chain.blocks_containing_tx.get and nonempty_intersection as above helpful)
                 # On failure: return False, "Input transaction not found"
-                # check if input transaction is on the same block   
-                if in_tx_hash in chain.blocks_containing_tx:
-                    # check if input transaction is on same chain
-                    containing_blocks = chain.blocks_containing_tx.get(in_tx_hash, None)
-                    if not nonempty_intersection(containing_blocks, curr_chain):
-                        return False, "Input transaction not found"
-            
+                if in_tx_index is None and curr_chain.isdisjoint(chain.blocks_containing_tx.get(in_tx_hash, [])):
+                    return False, "Input transaction not found"
 
                 input_sum += input_tx.outputs[in_output_idx].amount
-                # add to set of inputs used in block for future checks
-                inputs_used_in_block.add(input_ref)
 
             # output validation
             output_sum = 0
@@ -293,12 +372,8 @@ class Block(ABC, persistent.Persistent):
 
             # the sum of the input values is at least the sum of the output values (no money created out of thin air) [test_no_money_creation]
             # On failure: return False, "Creating money"
-            # (checks that apply to genesis block)
             if input_sum < output_sum:
                 return False, "Creating money"
-            
-            # add to set of tx hashes in block
-            tx_hashes_in_block.add(tx.hash)
         
         return True, "All checks passed"
 
@@ -0,0 +1,154 @@
+import threading
+import queue
+import time
+import transaction
+from blockchain.orphans import OrphanPool
+
+#: Maximum number of received blocks waiting to be added to the chain
+BLOCK_QUEUE_SIZE = 1024
+
+#: Seconds submit waits for room in a full block queue before dropping the block
+BLOCK_QUEUE_TIMEOUT = 5
+
+class ChainService:
+
+    def __init__(self, chain, queue_size=BLOCK_QUEUE_SIZE, orphans=None, transaction_manager=None):
+        """ Long-lived owner of a node's blockchain: the only writer of the chain database.
+
+        Message handlers hand received blocks to submit, which only queues them; one worker thread
+        adds them in arrival order, so each block costs its validation plus the incremental index
+        update in Blockchain.add_block, on the one database connection opened for the node's lifetime.
+
+        Blocks whose parent is not in the chain yet are not validated but parked in an orphan pool,
+        and connected as soon as their parent is added (along with their own orphaned children).
+
+        Args:
+            chain (:obj:`Blockchain`): Blockchain to add blocks to (chaindb.chain for a node).
+            queue_size (int, optional): Maximum number of blocks waiting to be added.
+            orphans (:obj:`OrphanPool`, optional): Pool for blocks whose parent is missing (defaults to an empty one).
+            transaction_manager (:obj:`TransactionManager`, optional): Manager of the transactions of chain's database
+                connection (defaults to the calling thread's); a connection is bound to the manager it was opened with,
+                so commits from the worker thread must go through it.
+
+        Attributes:
+            blocks (:obj:`Queue` of (:obj:`Block`, function, function)): Submitted blocks waiting for the worker, with their callbacks.
+            orphans (:obj:`OrphanPool`): Blocks waiting for their parent, with their callbacks; only used by the worker.
+            thread (:obj:`Thread`): The worker thread (None until started).
+        """
+        self.chain = chain
+        self.blocks = queue.Queue(queue_size)
+        self.orphans = OrphanPool() if orphans is None else orphans
+        self.transaction_manager = transaction.manager if transaction_manager is None else transaction_manager
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """ Starts the worker thread, if not already running. """
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def submit(self, block, on_done=None, on_orphan=None):
+        """ Queues a block to be added to the chain and returns without waiting for validation.
+
+        Args:
+            block (:obj:`Block`): Block to add.
+            on_done (function, optional): Called on the worker thread as on_done(block, added) once the
+                block is handled; added is True iff the block was new and valid. For an orphan this is
+                when its parent is added, or with added False when it is evicted from the orphan pool.
+            on_orphan (function, optional): Called on the worker thread as on_orphan(block) if the block is
+                parked in the orphan pool, eg to request its missing parent from the peer that sent it.
+
+        Returns:
+            bool: True if the block was queued, False if the queue stayed full for BLOCK_QUEUE_TIMEOUT seconds.
+        """
+        self.start()
+        try:
+            self.blocks.put((block, on_done, on_orphan), timeout=BLOCK_QUEUE_TIMEOUT)
+        except queue.Full:
+            return False
+        return True
+
+    def run(self):
+        """ Worker thread; handles queued blocks one at a time. """
+        while True:
+            block, on_done, on_orphan = self.blocks.get()
+            self.connect(block, on_done, on_orphan)
+            for orphan, orphan_done in self.orphans.expire():
+                self.report(orphan, orphan_done, False)
+            self.blocks.task_done()
+
+    def connect(self, block, on_done, on_orphan=None):
+        """ Adds a block to the chain, or parks it in the orphan pool if its parent is missing (calling
+        on_orphan, see submit); once added, its orphaned descendants are connected in turn.
+        """
+        pending = [(block, on_done)]
+        while pending:
+            block, on_done = pending.pop(0)
+            if not block.is_genesis and block.parent_hash not in self.chain.blocks and block.hash not in self.chain.blocks:
+                # (only the submitted block can get here; its descendants are connected once it is added)
+                known = block.hash in self.orphans
+                for orphan, orphan_done in self.orphans.add(block, on_done):
+                    self.report(orphan, orphan_done, False)
+                if not known and block.hash in self.orphans and on_orphan is not None:
+                    try:
+                        on_orphan(block)
+                    except Exception as e:
+                        print("[chain error] Orphan callback failed for block", block.hash)
+                        print(e)
+                continue
+            try:
+                added = self.add_block(block)
+            except Exception as e:
+                print("[chain error] Failed to handle block", block.hash)
+                print(e)
+                added = False
+            self.report(block, on_done, added)
+            if added:
+                pending.extend(self.orphans.pop_children(block.hash))
+
+    def report(self, block, on_done, added):
+        """ Calls a block's on_done callback (see submit), if any. """
+        if on_done is None:
+            return
+        try:
+            on_done(block, added)
+        except Exception as e:
+            print("[chain error] Callback failed for block", block.hash)
+            print(e)
+
+    def add_block(self, block):
+        """ Validates a block and adds it to the chain, committing the change.
+
+        Returns:
+            bool: True if the block was added, False if it was already in the chain or invalid.
+        """
+        if self.chain.get_verdict(block.hash) is not None:
+            return False # already added, and validated then
+        try:
+            added = self.chain.add_block(block, save=False)
+            if added:
+                self.transaction_manager.commit()
+            return added
+        except Exception:
+            self.transaction_manager.abort() # drop any partial index update
+            raise
+
+    def wait(self, timeout=None):
+        """ Waits until every submitted block has been handled.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait (defaults to no limit).
+
+        Returns:
+            bool: True if the queue was drained, False on timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.blocks.all_tasks_done:
+            while self.blocks.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.blocks.all_tasks_done.wait(remaining)
+        return True
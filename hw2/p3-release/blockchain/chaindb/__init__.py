@@ -1,7 +1,10 @@
 import config
 from blockchain.chaindb.chain import Blockchain
+from blockchain.chain_service import ChainService
 import ZODB, ZODB.FileStorage
 import transaction
+import threading
+from contextlib import contextmanager
 
 # Setup db and make module globals available
 storage = ZODB.FileStorage.FileStorage(config.DB_PATH)
@@ -11,4 +14,36 @@ if not hasattr(connection.root, "blockchain"):
     connection.root.blockchain = Blockchain()
     transaction.commit()
 
-chain = connection.root.blockchain
+chain = connection.root.blockchain # owned by the chain service's worker once it runs; other threads use read_chain
+
+# the node's chain service, created by the first get_service() call (scripts that only write the db never start it)
+service = None
+service_lock = threading.Lock()
+
+def get_service():
+    """ Returns the node's ChainService, the single writer of chain, starting it on first use. """
+    global service
+    with service_lock:
+        if service is None:
+            service = ChainService(chain, transaction_manager=connection.transaction_manager)
+            service.start()
+        return service
+
+@contextmanager
+def read_chain():
+    """ Borrow a connection from the database's pool, to read the chain from a thread other than the chain service's.
+
+    ZODB connections and the objects loaded through them are not thread-safe, and chain belongs
+    to the service's worker, which commits on it; each reader gets its own connection and
+    transaction manager instead, and sync() moves it to the service's latest commit.
+
+    Yields:
+        (:obj:`Blockchain`): the blockchain as of the latest commit.
+    """
+    reader = db.open(transaction_manager=transaction.TransactionManager())
+    try:
+        reader.sync()
+        yield reader.root.blockchain
+    finally:
+        reader.transaction_manager.abort() # readers never write
+        reader.close()
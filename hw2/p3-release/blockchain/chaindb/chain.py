@@ -3,6 +3,7 @@ import config
 import blockchain
 from blockchain.util import encode_as_str
 import transaction, persistent
+from blockchain.utxo import ChainView
 
 class Blockchain(persistent.Persistent):
 
@@ -15,12 +16,14 @@ class Blockchain(persistent.Persistent):
             blocks_spending_input (:obj:`dict` of (str to (:obj:`list` of str))): Maps input references as strings to all blocks in the DB that spent them as list of their hashes.
             blocks_containing_tx (:obj:`dict` of (str to (:obj:`list` of str))): Maps transaction hashes to all blocks in the DB that spent them as list of their hashes.
             all_transactions (:obj:`dict` of (str to :obj:`Transaction`)): Maps transaction hashes to their corresponding Transaction objects.
+            verdicts (:obj:`dict` of (str to (bool, str))): Maps block hashes to the is_valid() result recorded when they were added.
         """
         self.chain = {}
         self.blocks = {}
         self.blocks_spending_input = {}
         self.blocks_containing_tx = {}
         self.all_transactions = {}
+        self.verdicts = {}
 
     def add_block(self, block, save=True):
         """ Adds a block to the blockchain; the block must be valid according to all block rules.
@@ -34,8 +37,12 @@ class Blockchain(persistent.Persistent):
         """
         if block.hash in self.blocks:
             return False
-        if not block.is_valid()[0]:
+        verdict = block.is_valid()
+        if not verdict[0]:
             return False
+        if not hasattr(self, "verdicts"): # databases created before verdicts were recorded
+            self.verdicts = {}
+        self.verdicts[block.hash] = verdict
         if not block.height in self.chain:
             self.chain[block.height] = []
         if not block.hash in self.chain[block.height]:
@@ -57,6 +64,36 @@ class Blockchain(persistent.Persistent):
             transaction.commit() # If we're going to save the block, commit the transaction.
         return True
 
+    def get_verdict(self, block_hash):
+        """ Return the validation verdict recorded when a block was added.
+
+        A block's hash fixes its contents and its parent, hence its whole ancestry, so its verdict never changes.
+
+        Args:
+            block_hash (str): Hash of the block.
+
+        Returns:
+            bool, str: The block's is_valid() result, or None if it is not in the blockchain.
+        """
+        verdict = getattr(self, "verdicts", {}).get(block_hash)
+        if verdict is None and block_hash in self.blocks:
+            verdict = (True, "All checks passed") # added before verdicts were recorded; only valid blocks are added
+        return verdict
+
+    def get_validity(self, block):
+        """ Return whether a block is valid, running Block.is_valid only for blocks not in the blockchain.
+
+        Args:
+            block (:obj:`Block`): Block to check.
+
+        Returns:
+            bool, str: True if block is valid, False otherwise plus an error or success message.
+        """
+        verdict = self.get_verdict(block.hash)
+        if verdict is None:
+            verdict = block.is_valid()
+        return verdict
+
     def get_heights_with_blocks(self):
         """ Return all heights in the blockchain that contain blocks.
 
@@ -103,6 +140,52 @@ class Blockchain(persistent.Persistent):
         return chain        
         # return [block_hash]
 
+    def get_utxo_view(self, block_hash):
+        """ Return a view of the UTXO state at the end of the chain ending with the provided hash.
+
+        The view of the last chain end asked for is kept: a block's hash fixes the blocks of the
+        chain ending with it, so checking many transactions against one tip walks the chain once.
+
+        Args:
+            block_hash (str): Block hash of highest block in desired chain (None for the empty chain).
+
+        Returns:
+            (:obj:`ChainView`): view of unspent outputs and included transactions on that chain.
+        """
+        view = getattr(self, "_v_utxo_view", None) # _v_ attributes are never saved to ZODB
+        if view is None or view.block_hash != block_hash:
+            view = ChainView(self, block_hash)
+            if block_hash is None or block_hash in self.blocks: # a missing block's view would go stale once it is added
+                self._v_utxo_view = view
+        return view
+
+    def get_path(self, from_hash, to_hash):
+        """ Return the blocks leaving and joining a chain whose end moves from one block to another.
+
+        Args:
+            from_hash (str): Block hash of the current end of the chain (None for the empty chain).
+            to_hash (str): Block hash of its new end (None for the empty chain).
+
+        Returns:
+            (:obj:`list` of :obj:`Block`, :obj:`list` of :obj:`Block`): Blocks leaving the chain
+                (highest first) and blocks joining it (lowest first).
+        """
+        disconnected = []
+        connected = []
+        while from_hash != to_hash:
+            from_height = self.blocks[from_hash].height if from_hash is not None else -1
+            to_height = self.blocks[to_hash].height if to_hash is not None else -1
+            if from_height >= to_height:
+                block = self.blocks[from_hash]
+                disconnected.append(block)
+                from_hash = None if block.is_genesis else block.parent_hash
+            else:
+                block = self.blocks[to_hash]
+                connected.append(block)
+                to_hash = None if block.is_genesis else block.parent_hash
+        connected.reverse()
+        return disconnected, connected
+
     def get_all_block_weights(self):
         """ Get total weight for every block in the blockchain database.
         (eg if a block is at height 3, and all blocks have weight 1, the block will have weight 4 across blocks 0,1,2,3)
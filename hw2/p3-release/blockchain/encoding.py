@@ -0,0 +1,160 @@
+import binascii
+import struct
+
+#: Version byte leading every binary-encoded block, bumped on incompatible format changes
+FORMAT_VERSION = 2
+
+#: Size in bytes of a raw SHA256 hash on the wire
+HASH_SIZE = 32
+
+#: Maximum length in bytes of a varint read from the wire (64 bits)
+MAX_VARINT_BYTES = 10
+
+#: Smallest and largest integers carried by a signed varint (64 bits, as their zigzag encoding is read with MAX_VARINT_BYTES)
+MIN_SIGNED_VARINT = -2 ** 63
+MAX_SIGNED_VARINT = 2 ** 63 - 1
+
+#: Maximum length in bytes of a block's target varint (the largest target, 2 ** 256, takes 257 bits)
+MAX_TARGET_VARINT_BYTES = 37
+
+def write_varint(buf, value):
+    """ Appends a non-negative integer of any size as an unsigned LEB128 varint (7 bits per byte, low bits first).
+
+    Args:
+        buf (bytearray): Buffer to append to.
+        value (int): Integer to encode.
+    """
+    if value < 0:
+        raise ValueError("varints must be non-negative")
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+def write_signed_varint(buf, value):
+    """ Appends a signed 64-bit integer as a zigzag-encoded varint (0, -1, 1, -2, ... map to 0, 1, 2, 3, ...).
+
+    Raises ValueError for values outside [MIN_SIGNED_VARINT, MAX_SIGNED_VARINT], which no peer would decode.
+    """
+    if not MIN_SIGNED_VARINT <= value <= MAX_SIGNED_VARINT:
+        raise ValueError("signed varints must fit in 64 bits")
+    write_varint(buf, value * 2 if value >= 0 else -value * 2 - 1)
+
+def write_str(buf, value):
+    """ Appends a string as a varint byte length followed by its UTF-8 encoding. """
+    encoded = value.encode("utf-8")
+    write_varint(buf, len(encoded))
+    buf += encoded
+
+def is_canonical_hash(value):
+    """ Returns True iff value is a lowercase hex SHA256 hash, ie it survives a round trip through raw bytes. """
+    if len(value) != 2 * HASH_SIZE:
+        return False
+    try:
+        return binascii.hexlify(binascii.unhexlify(value)).decode("ascii") == value
+    except (binascii.Error, UnicodeEncodeError):
+        return False
+
+def write_hash(buf, value):
+    """ Appends a hash field: varint 0 then the raw 32 bytes for a hex hash, or varint (length + 1)
+    then the UTF-8 bytes for anything else (eg a genesis block's "genesis" parent hash).
+    """
+    if is_canonical_hash(value):
+        buf.append(0)
+        buf += binascii.unhexlify(value)
+    else:
+        encoded = value.encode("utf-8")
+        write_varint(buf, len(encoded) + 1)
+        buf += encoded
+
+def write_input_ref(buf, input_ref):
+    """ Appends an input reference: for the usual [tx_hash:output_index] form varint 0, the raw
+    32-byte hash and the index as a varint; otherwise varint (length + 1) then the UTF-8 bytes.
+    """
+    parts = input_ref.split(":")
+    if len(parts) == 2 and is_canonical_hash(parts[0]) and parts[1].isdigit() and str(int(parts[1])) == parts[1]:
+        buf.append(0)
+        buf += binascii.unhexlify(parts[0])
+        write_varint(buf, int(parts[1]))
+    else:
+        encoded = input_ref.encode("utf-8")
+        write_varint(buf, len(encoded) + 1)
+        buf += encoded
+
+def write_float(buf, value):
+    """ Appends a float as a big-endian IEEE 754 double (exact, so str(value) is unchanged after decoding). """
+    buf += struct.pack(">d", value)
+
+class Reader:
+
+    def __init__(self, data):
+        """ Sequential decoder over binary data, reading through a memoryview so no field is copied
+        until it is turned into its final Python value.
+
+        Args:
+            data (bytes-like): Encoded data.
+
+        Attributes:
+            view (memoryview): Byte view of the data.
+            offset (int): Position of the next unread byte.
+        """
+        self.view = memoryview(data).cast("B")
+        self.offset = 0
+
+    def at_end(self):
+        """ Returns True iff every byte has been read. """
+        return self.offset == len(self.view)
+
+    def read_bytes(self, length):
+        """ Returns the next length bytes as a memoryview slice (no copy); raises ValueError if truncated. """
+        if length < 0 or self.offset + length > len(self.view):
+            raise ValueError("truncated data")
+        field = self.view[self.offset:self.offset + length]
+        self.offset += length
+        return field
+
+    def read_varint(self, max_bytes=MAX_VARINT_BYTES):
+        """ Reads an unsigned varint (see write_varint); raises ValueError if it is longer than max_bytes. """
+        value = 0
+        shift = 0
+        while True:
+            if shift >= 7 * max_bytes:
+                raise ValueError("varint too long")
+            if self.offset >= len(self.view):
+                raise ValueError("truncated varint")
+            byte = self.view[self.offset]
+            self.offset += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def read_signed_varint(self):
+        """ Reads a zigzag-encoded varint (see write_signed_varint); raises ValueError if it does not fit in 64 bits. """
+        value = self.read_varint()
+        if value >> 64:
+            raise ValueError("signed varint too large")
+        return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+    def read_str(self):
+        """ Reads a length-prefixed UTF-8 string (see write_str). """
+        return str(self.read_bytes(self.read_varint()), "utf-8")
+
+    def read_hash(self):
+        """ Reads a hash field (see write_hash) as a hex (or plain) string. """
+        length = self.read_varint()
+        if length == 0:
+            return binascii.hexlify(self.read_bytes(HASH_SIZE)).decode("ascii")
+        return str(self.read_bytes(length - 1), "utf-8")
+
+    def read_input_ref(self):
+        """ Reads an input reference (see write_input_ref) as a [tx_hash:output_index] string. """
+        length = self.read_varint()
+        if length == 0:
+            tx_hash = binascii.hexlify(self.read_bytes(HASH_SIZE)).decode("ascii")
+            return tx_hash + ":" + str(self.read_varint())
+        return str(self.read_bytes(length - 1), "utf-8")
+
+    def read_float(self):
+        """ Reads a big-endian double (see write_float). """
+        return struct.unpack(">d", self.read_bytes(8))[0]
@@ -0,0 +1,76 @@
+import binascii
+import config
+from ecdsa import SigningKey, VerifyingKey, NIST192p
+from ecdsa.ellipticcurve import PointJacobi
+
+# parsed keys by their hex encoding, so each key is parsed (and precomputed) once per process
+signing_keys = {}
+verifying_keys = {}
+
+def load_signing_key(secret_key):
+    """ Parses a hex-encoded NIST192p secret key into a SigningKey.
+
+    Args:
+        secret_key (str): Hex-encoded raw secret key.
+
+    Returns:
+        (:obj:`SigningKey`): the parsed key.
+    """
+    return SigningKey.from_string(binascii.unhexlify(secret_key), curve=NIST192p)
+
+def load_verifying_key(public_key):
+    """ Parses a hex-encoded NIST192p public key into a VerifyingKey with precomputed tables.
+
+    Precomputation makes every later verify() about twice as fast, so parse each key once and reuse it.
+
+    Args:
+        public_key (str): Hex-encoded raw public key (x || y).
+
+    Returns:
+        (:obj:`VerifyingKey`): the parsed key.
+    """
+    point = VerifyingKey.from_string(binascii.unhexlify(public_key), curve=NIST192p).pubkey.point
+    # from_string drops the curve order, which precompute() needs, so rebuild the point with it
+    point = PointJacobi(NIST192p.curve, point.x(), point.y(), 1, NIST192p.order, generator=True)
+    key = VerifyingKey.from_public_point(point, curve=NIST192p)
+    key.precompute()
+    return key
+
+def get_signing_key(secret_key):
+    """ Returns the SigningKey for a hex-encoded secret key, parsing it only the first time. """
+    if secret_key not in signing_keys:
+        signing_keys[secret_key] = load_signing_key(secret_key)
+    return signing_keys[secret_key]
+
+def get_verifying_key(public_key):
+    """ Returns the VerifyingKey for a hex-encoded public key, parsing it only the first time. """
+    if public_key not in verifying_keys:
+        verifying_keys[public_key] = load_verifying_key(public_key)
+    return verifying_keys[public_key]
+
+def get_authority_signing_key():
+    """ Returns the SigningKey of the PoA authority (config.AUTHORITY_SK). """
+    return get_signing_key(config.AUTHORITY_SK)
+
+def get_authority_verifying_key():
+    """ Returns the VerifyingKey of the PoA authority (config.AUTHORITY_PK). """
+    return get_verifying_key(config.AUTHORITY_PK)
+
+def get_node_signing_key(node_id):
+    """ Returns the SigningKey of a node in the PKI (config.SECRET_KEYS), eg to sign its BA votes. """
+    return get_signing_key(config.SECRET_KEYS[node_id])
+
+def get_node_verifying_key(node_id):
+    """ Returns the VerifyingKey of a node in the PKI (config.PUBLIC_KEYS), eg to check its BA votes. """
+    return get_verifying_key(config.PUBLIC_KEYS[node_id])
+
+def load_config_keys():
+    """ Parses the authority's and every node's keys from config, so no signing or verification pays for parsing. """
+    get_authority_signing_key()
+    get_authority_verifying_key()
+    for node_id in config.SECRET_KEYS:
+        get_node_signing_key(node_id)
+    for node_id in config.PUBLIC_KEYS:
+        get_node_verifying_key(node_id)
+
+load_config_keys()
@@ -0,0 +1,232 @@
+import heapq
+
+class MempoolEntry:
+
+    def __init__(self, tx, fee, sequence, parents):
+        """ A transaction waiting in the mempool.
+
+        Args:
+            tx (:obj:`Transaction`): The transaction.
+            fee (int): Sum of its inputs minus sum of its outputs, collected by the block including it.
+            sequence (int): Arrival order in the mempool; lower is older.
+            parents (:obj:`set` of str): Hashes of pooled transactions whose outputs it spends.
+        """
+        self.tx = tx
+        self.fee = fee
+        self.sequence = sequence
+        self.parents = parents
+
+class Mempool:
+
+    def __init__(self, chain, tip_hash=None):
+        """ Pool of valid transactions waiting to be included in a block extending a chain tip.
+
+        Transactions are checked against the UTXO state at the tip (see Blockchain.get_utxo_view) and
+        against each other: a transaction may spend outputs of pooled transactions (chained spends),
+        but no two pooled transactions spend the same output (the first one seen is kept). Moving the
+        tip, whether by extending the chain or by a reorg, only re-checks the transactions touching
+        the blocks between the old and the new tip (see set_tip).
+
+        Args:
+            chain (:obj:`Blockchain`): Blockchain the transactions will be included in.
+            tip_hash (str, optional): Hash of the block the next block will extend (defaults to the empty chain).
+
+        Attributes:
+            tip (str): Hash of the block the pooled transactions are valid on top of (None for the empty chain).
+            entries (:obj:`dict` of (str to :obj:`MempoolEntry`)): Maps hashes of pooled transactions to their entries.
+            spenders (:obj:`dict` of (str to str)): Maps input references spent in the pool to the hash of the transaction spending them.
+            dependents (:obj:`dict` of (str to (:obj:`set` of str))): Maps transaction hashes (pooled or on chain) to the pooled transactions spending their outputs.
+            next_sequence (int): Sequence number of the next transaction to arrive.
+        """
+        self.chain = chain
+        self.tip = tip_hash
+        self.entries = {}
+        self.spenders = {}
+        self.dependents = {}
+        self.next_sequence = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, tx_hash):
+        return tx_hash in self.entries
+
+    def get_view(self):
+        """ Returns a view of the UTXO state at the tip (fetched per operation, as the chain may have moved since). """
+        return self.chain.get_utxo_view(self.tip)
+
+    def get_output(self, input_ref, view):
+        """ Returns the output an input reference points to if it exists and is unspent at the tip
+        or created by a pooled transaction (spent in the pool or not), or None otherwise.
+        """
+        input_parts = input_ref.split(":")
+        if len(input_parts) != 2 or not input_parts[1].isdigit():
+            return None
+        in_tx_hash, in_output_idx = input_parts[0], int(input_parts[1])
+        if in_tx_hash in self.entries:
+            outputs = self.entries[in_tx_hash].tx.outputs
+            return outputs[in_output_idx] if in_output_idx < len(outputs) else None
+        if view.is_unspent(input_ref):
+            return self.chain.all_transactions[in_tx_hash].outputs[in_output_idx]
+        return None
+
+    def is_spendable(self, input_ref, view=None):
+        """ Returns True iff a new transaction added to the pool could spend the output referenced by input_ref.
+
+        Args:
+            input_ref (str): Reference to the output, in the form [tx_hash:list_index_of_output].
+            view (:obj:`UTXOView`, optional): View of the UTXO state at the tip (defaults to get_view()).
+        """
+        if input_ref in self.spenders:
+            return False
+        return self.get_output(input_ref, view or self.get_view()) is not None
+
+    def add(self, tx, view=None):
+        """ Adds a transaction to the pool if it is valid on top of the tip and the pooled transactions.
+
+        Args:
+            tx (:obj:`Transaction`): Transaction to add.
+            view (:obj:`UTXOView`, optional): View of the UTXO state at the tip (defaults to get_view()); pass the
+                same view when adding many transactions while the chain does not change.
+
+        Returns:
+            bool: True on success, False otherwise (invalid, already pooled or included, or conflicting with a pooled transaction).
+        """
+        return self.insert(tx, view or self.get_view())
+
+    def insert(self, tx, view, sequence=None):
+        """ Checks a transaction and adds it to the indexes (see add).
+
+        Args:
+            tx (:obj:`Transaction`): Transaction to add.
+            view (:obj:`UTXOView`): View of the UTXO state at the tip.
+            sequence (int, optional): Arrival order to keep (for transactions re-checked by set_tip); defaults to a new one.
+
+        Returns:
+            bool: True on success, False otherwise.
+        """
+        if tx.hash in self.entries or view.has_transaction(tx.hash):
+            return False
+        if not tx.is_valid() or not tx.hash_is_valid() or len(set(tx.input_refs)) != len(tx.input_refs):
+            return False
+        sender = tx.outputs[0].sender
+        input_sum = 0
+        parents = set()
+        for input_ref in tx.input_refs:
+            if input_ref in self.spenders:
+                return False
+            output = self.get_output(input_ref, view)
+            if output is None or output.receiver != sender:
+                return False
+            input_sum += output.amount
+            in_tx_hash = input_ref.split(":")[0]
+            if in_tx_hash in self.entries:
+                parents.add(in_tx_hash)
+        output_sum = 0
+        for output in tx.outputs:
+            if output.sender != sender:
+                return False
+            output_sum += output.amount
+        if input_sum < output_sum:
+            return False
+
+        if sequence is None:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+        self.entries[tx.hash] = MempoolEntry(tx, input_sum - output_sum, sequence, parents)
+        for input_ref in tx.input_refs:
+            self.spenders[input_ref] = tx.hash
+            self.dependents.setdefault(input_ref.split(":")[0], set()).add(tx.hash)
+        return True
+
+    def remove(self, tx_hash):
+        """ Removes a pooled transaction along with every pooled transaction depending on it.
+
+        Args:
+            tx_hash (str): Hash of the transaction to remove.
+
+        Returns:
+            (:obj:`list` of :obj:`MempoolEntry`): The removed entries, oldest first.
+        """
+        removed = []
+        to_remove = [tx_hash]
+        while to_remove:
+            tx_hash = to_remove.pop()
+            if tx_hash not in self.entries:
+                continue
+            entry = self.entries.pop(tx_hash)
+            for input_ref in entry.tx.input_refs:
+                del self.spenders[input_ref]
+            for in_tx_hash in set(input_ref.split(":")[0] for input_ref in entry.tx.input_refs):
+                siblings = self.dependents[in_tx_hash]
+                siblings.discard(tx_hash)
+                if not siblings:
+                    del self.dependents[in_tx_hash]
+            to_remove.extend(self.dependents.get(tx_hash, ()))
+            removed.append(entry)
+        removed.sort(key=lambda entry: entry.sequence)
+        return removed
+
+    def set_tip(self, block_hash):
+        """ Moves the pool on top of another block (eg after it is added, or to build on a fork).
+
+        Pooled transactions included by the newly connected blocks leave the pool, and so do those
+        conflicting with them; transactions of disconnected blocks come back to the pool if they are
+        still valid. Only pooled transactions touching the blocks in between (and their dependents)
+        are re-checked, in their original arrival order.
+
+        Args:
+            block_hash (str): Hash of the block the next block will extend (None for the empty chain).
+        """
+        disconnected, connected = self.chain.get_path(self.tip, block_hash)
+        self.tip = block_hash
+        if not disconnected and not connected:
+            return
+        touched = set()
+        for block in disconnected + connected:
+            for tx in block.transactions:
+                if tx.hash in self.entries:
+                    touched.add(tx.hash)
+                touched.update(self.dependents.get(tx.hash, ())) # spending its outputs
+                for input_ref in tx.input_refs:
+                    if input_ref in self.spenders:
+                        touched.add(self.spenders[input_ref])
+        removed = []
+        for tx_hash in touched:
+            removed.extend(self.remove(tx_hash))
+        view = self.get_view()
+        for block in reversed(disconnected):
+            for tx in block.transactions:
+                self.insert(tx, view)
+        for entry in sorted(removed, key=lambda entry: entry.sequence):
+            self.insert(entry.tx, view, entry.sequence)
+
+    def build_template(self, max_txs=900):
+        """ Selects pooled transactions for a block extending the tip, highest fee first and oldest first among equal fees.
+
+        A transaction becomes eligible once every pooled transaction it spends from is selected, so
+        the result can be used as a block's transactions as is; selection is O(n log n) in the pool size.
+
+        Args:
+            max_txs (int, optional): Maximum number of transactions to select (defaults to the block limit of 900).
+
+        Returns:
+            (:obj:`list` of :obj:`Transaction`): The selected transactions, each after the transactions it spends from.
+        """
+        missing_parents = {}
+        ready = []
+        for tx_hash, entry in self.entries.items():
+            missing_parents[tx_hash] = len(entry.parents)
+            if not entry.parents:
+                ready.append((-entry.fee, entry.sequence, tx_hash))
+        heapq.heapify(ready)
+        template = []
+        while ready and len(template) < max_txs:
+            tx_hash = heapq.heappop(ready)[2]
+            template.append(self.entries[tx_hash].tx)
+            for child_hash in self.dependents.get(tx_hash, ()):
+                missing_parents[child_hash] -= 1
+                if missing_parents[child_hash] == 0:
+                    child = self.entries[child_hash]
+                    heapq.heappush(ready, (-child.fee, child.sequence, child_hash))
+        return template
@@ -0,0 +1,96 @@
+import collections
+import time
+
+#: Maximum number of orphan blocks kept; the oldest is evicted first
+MAX_ORPHANS = 1000
+
+#: Seconds an orphan block waits for its parent before it is evicted
+MAX_ORPHAN_AGE = 600
+
+class OrphanPool:
+
+    def __init__(self, max_size=MAX_ORPHANS, max_age=MAX_ORPHAN_AGE):
+        """ Bounded pool of blocks received before their parent (orphans), keyed by parent hash.
+
+        Blocks gossiped concurrently often arrive out of order; rather than failing validation
+        ("Nonexistent parent") and waiting for the network to send them again, they wait here
+        until their parent is added (see pop_children).
+
+        Args:
+            max_size (int, optional): Maximum number of orphans kept.
+            max_age (float, optional): Seconds an orphan is kept.
+
+        Attributes:
+            orphans (:obj:`OrderedDict` of (str to (:obj:`Block`, object, float))): Maps orphan hashes to
+                (block, data passed to add, arrival time), oldest first.
+            children (:obj:`dict` of (str to (:obj:`list` of str))): Maps missing parent hashes to the hashes of their orphans.
+        """
+        self.max_size = max_size
+        self.max_age = max_age
+        self.orphans = collections.OrderedDict()
+        self.children = {}
+
+    def __contains__(self, block_hash):
+        return block_hash in self.orphans
+
+    def __len__(self):
+        return len(self.orphans)
+
+    def add(self, block, data=None, now=None):
+        """ Adds an orphan, evicting orphans that are too old and then the oldest ones over max_size.
+
+        Args:
+            block (:obj:`Block`): Block whose parent is not in the chain.
+            data (object, optional): Returned along with the block when it leaves the pool.
+            now (float, optional): Current time (defaults to time.time()).
+
+        Returns:
+            (:obj:`list` of (:obj:`Block`, object)): Evicted orphans (possibly including block itself).
+        """
+        now = time.time() if now is None else now
+        if block.hash not in self.orphans:
+            self.orphans[block.hash] = (block, data, now)
+            self.children.setdefault(block.parent_hash, []).append(block.hash)
+        evicted = self.expire(now)
+        while len(self.orphans) > self.max_size:
+            evicted.append(self.remove(next(iter(self.orphans))))
+        return evicted
+
+    def expire(self, now=None):
+        """ Evicts every orphan older than max_age.
+
+        Returns:
+            (:obj:`list` of (:obj:`Block`, object)): Evicted orphans.
+        """
+        now = time.time() if now is None else now
+        evicted = []
+        while self.orphans:
+            block_hash, (block, data, arrived) = next(iter(self.orphans.items()))
+            if now - arrived <= self.max_age:
+                break
+            evicted.append(self.remove(block_hash))
+        return evicted
+
+    def remove(self, block_hash):
+        """ Removes an orphan from the pool.
+
+        Returns:
+            (:obj:`Block`, object): The orphan and its data.
+        """
+        block, data, arrived = self.orphans.pop(block_hash)
+        siblings = self.children[block.parent_hash]
+        siblings.remove(block_hash)
+        if not siblings:
+            del self.children[block.parent_hash]
+        return block, data
+
+    def pop_children(self, parent_hash):
+        """ Removes and returns the orphans waiting for a parent, in arrival order.
+
+        Args:
+            parent_hash (str): Hash of the block just added to the chain.
+
+        Returns:
+            (:obj:`list` of (:obj:`Block`, object)): Its orphaned children and their data.
+        """
+        return [self.remove(block_hash) for block_hash in list(self.children.get(parent_hash, []))]
@@ -1,6 +1,75 @@
 import blockchain
 from blockchain.block import Block
-from blockchain.util import nonempty_intersection
+from blockchain.util import nonempty_intersection, sha256_midstate, sha256_2_nonce_batch
+import multiprocessing
+import atexit
+import time
+
+#: Number of nonces handed to a mining worker per task
+NONCES_PER_TASK = 1 << 14
+
+#: Number of nonces a worker tries between checks of whether another worker already found a seal
+STOP_CHECK_INTERVAL = 1 << 10
+
+# process pool shared by all mining calls (created lazily), and the event its workers use to stop early
+mining_pool = None
+mining_pool_size = None
+mining_stop_event = None
+
+# in a worker process, the pool's stop event (set by init_mining_worker)
+stop_event = None
+
+def init_mining_worker(event):
+    """ Pool initializer; makes the miner's stop event available to the worker process. """
+    global stop_event
+    stop_event = event
+
+def get_mining_pool(processes):
+    """ Returns the shared mining pool with the given number of worker processes, creating it if needed. """
+    global mining_pool, mining_pool_size, mining_stop_event
+    if mining_pool is None or mining_pool_size != processes:
+        if mining_pool is not None:
+            mining_pool.terminate()
+        # fork where possible; spawned workers would re-import blockchain and try to reopen the locked database
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        mining_stop_event = context.Event()
+        mining_pool = context.Pool(processes, initializer=init_mining_worker, initargs=(mining_stop_event,))
+        mining_pool_size = processes
+    return mining_pool
+
+def terminate_mining_pool():
+    """ Terminates the mining pool's worker processes, if any; runs at exit. """
+    if mining_pool is not None:
+        mining_pool.terminate()
+
+atexit.register(terminate_mining_pool)
+
+def search_nonce_range(header_prefix, target, start, stop):
+    """ Brute-forces the nonces in [start, stop) for a seal satisfying the target.
+
+    Args:
+        header_prefix (str): The block's header up to (not including) the seal data.
+        target (int): Target the SHA256^2 hash of the header must not exceed.
+        start (int): First nonce to try.
+        stop (int): Nonce to stop at (exclusive).
+
+    Returns:
+        (int, int): the valid nonce found (None if none / stopped early) and the number of hashes computed.
+    """
+    midstate = sha256_midstate(header_prefix)
+    for batch_start in range(start, stop, STOP_CHECK_INTERVAL):
+        if stop_event is not None and stop_event.is_set():
+            return None, batch_start - start
+        batch = sha256_2_nonce_batch(midstate, batch_start, min(STOP_CHECK_INTERVAL, stop - batch_start))
+        for i, block_hash in enumerate(batch):
+            if block_hash <= target:
+                if stop_event is not None:
+                    stop_event.set() # tell the other workers to give up on their ranges
+                return batch_start + i, batch_start - start + len(batch)
+    return None, stop - start
 
 class PoWBlock(Block):
     """ Extends Block, adding proof-of-work primitives. """
@@ -36,14 +105,49 @@ class PoWBlock(Block):
         
         # return 1
 
-    def mine(self):
+    def mine(self, processes=1):
         """ PoW mining loop; attempts to seal a block with new seal data until the seal is valid
             (performing brute-force mining).  Terminates once block is valid.
+
+            The nonce space is split into ranges of NONCES_PER_TASK searched in parallel by a
+            process pool; each worker hashes the header prefix once and only the nonce per attempt
+            (see util.sha256_midstate), and all workers stop as soon as one of them finds a seal.
+
+            Args:
+                processes (int, optional): Number of worker processes (defaults to 1, mining in-process).
+                    Workers are forked, so only ask for more from a process running no other threads
+                    (eg a standalone generator script, not a node).
+
+            Returns:
+                float: Hash rate achieved while mining, in hashes per second.
         """
-        nonce = 0
-        while not self.seal_is_valid():
-            self.set_seal_data(nonce)
-            nonce += 1
+        start_time = time.time()
+        if self.seal_is_valid():
+            return 0.0
+
+        header_prefix = self.unsealed_header() + "`"
+        nonce = None
+        hashes = 0
+        next_start = 0
+        if processes == 1:
+            while nonce is None:
+                nonce, tried = search_nonce_range(header_prefix, self.target, next_start, next_start + NONCES_PER_TASK)
+                hashes += tried
+                next_start += NONCES_PER_TASK
+        else:
+            pool = get_mining_pool(processes)
+            mining_stop_event.clear()
+            while nonce is None:
+                tasks = [(header_prefix, self.target, next_start + i * NONCES_PER_TASK, next_start + (i + 1) * NONCES_PER_TASK) for i in range(processes)]
+                next_start += processes * NONCES_PER_TASK
+                for found, tried in pool.starmap(search_nonce_range, tasks):
+                    hashes += tried
+                    if found is not None and (nonce is None or found < nonce):
+                        nonce = found
+
+        self.set_seal_data(nonce)
+        elapsed = time.time() - start_time
+        return hashes / elapsed if elapsed > 0 else float(hashes)
 
     def calculate_appropriate_target(self):
         """ For simplicity, we will just keep a constant target / difficulty
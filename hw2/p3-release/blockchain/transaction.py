@@ -1,4 +1,5 @@
 from blockchain.util import encode_as_str, sha256_2_string
+from blockchain.encoding import write_str, write_signed_varint, write_varint, write_input_ref, write_hash, MIN_SIGNED_VARINT, MAX_SIGNED_VARINT
 import persistent
 
 class TransactionOutput(persistent.Persistent):
@@ -19,19 +20,51 @@ class TransactionOutput(persistent.Persistent):
         """ Gets unique string representation of an output. """
         return encode_as_str([self.sender, self.receiver, self.amount], sep="~")
 
+    def encode(self, buf):
+        """ Appends the binary wire encoding of the output: sender and receiver as length-prefixed
+        strings, then the amount as a zigzag varint (see p2p.interfaces.transaction_output.read_output).
+
+        Args:
+            buf (bytearray): Buffer to append to.
+        """
+        write_str(buf, self.sender)
+        write_str(buf, self.receiver)
+        write_signed_varint(buf, self.amount)
+
+def verify_hashes(transactions):
+    """ Checks the (possibly claimed) hashes of a list of transactions in one pass; each is hashed at most once, ever.
+
+    Each result is remembered on its transaction (see Transaction.hash_is_valid), so checking the
+    same transactions again, eg when a block is revalidated, is free.
+
+    Args:
+        transactions (:obj:`list` of :obj:`Transaction`): Transactions to check, eg all of a block's.
+
+    Returns:
+        bool: True iff every transaction's hash matches its contents.
+    """
+    return all(tx.hash_is_valid() for tx in transactions)
+
 class Transaction(persistent.Persistent):
 
-    def __init__(self, input_refs, outputs):
+    def __init__(self, input_refs, outputs, claimed_hash=None):
         """ Class representing a transaction output in the UTXO model.
 
         Args:
             sender (str): Account sending (creating) the output.
             receiver (str): Account receiving (and later potentially spending) the output.
             amount (int): Amount being transferred.
+            claimed_hash (str, optional): Hash received along with the transaction; trusted until
+                hash_is_valid() checks it (during block validation) instead of being computed here.
         """
         self.input_refs = input_refs
         self.outputs = outputs
-        self.hash = self.calculate_hash()
+        if claimed_hash is None:
+            self.hash = self.calculate_hash()
+            self._v_hash_valid = True
+        else:
+            self.hash = claimed_hash
+            self._v_hash_valid = None # not checked yet
 
     def calculate_hash(self):
         """ Get the hash of the block header.
@@ -41,8 +74,28 @@ class Transaction(persistent.Persistent):
         """
         return sha256_2_string(str(self.header()))
 
+    def hash_is_valid(self):
+        """ Checks that self.hash is the transaction's hash, computing it at most once per transaction.
+
+        Transactions loaded from the database were checked before their block was added, so
+        only transactions decoded with a claimed hash are ever hashed here.
+
+        Returns:
+            bool: True iff self.hash matches calculate_hash().
+        """
+        hash_valid = getattr(self, "_v_hash_valid", True)
+        if hash_valid is None:
+            hash_valid = self.hash == self.calculate_hash()
+            self._v_hash_valid = hash_valid
+        return hash_valid
+
     def is_valid(self):
-        """ Checks if a transaction is well-formed, returning True iff a transaction obeys syntactic rules. """
+        """ Checks if a transaction is well-formed, returning True iff a transaction obeys syntactic rules.
+
+        Output amounts must fit the wire format's 64-bit signed varints, so every block accepted can be gossiped.
+        """
+        if not all(MIN_SIGNED_VARINT <= output.amount <= MAX_SIGNED_VARINT for output in self.outputs):
+            return False
         return len(self.input_refs) < 10 and len(self.outputs) < 10 and len(self.input_refs) > 0 and len(self.outputs) > 0
 
     def header(self):
@@ -52,3 +105,24 @@ class Transaction(persistent.Persistent):
     def __repr__(self):
         """ Get unique string encoding of a transaction, including its hash (ID). """
         return encode_as_str([self.hash, self.header()], sep="-")
+
+    def encode(self, buf):
+        """ Appends the binary wire encoding of the transaction: its hash, the number of input references
+        and each reference, then the number of outputs and each output (see p2p.interfaces.transaction.read_transaction).
+
+        Args:
+            buf (bytearray): Buffer to append to.
+        """
+        write_hash(buf, self.hash)
+        write_varint(buf, len(self.input_refs))
+        for input_ref in self.input_refs:
+            write_input_ref(buf, input_ref)
+        write_varint(buf, len(self.outputs))
+        for output in self.outputs:
+            output.encode(buf)
+
+    def to_bytes(self):
+        """ Get the binary wire encoding of the transaction (see encode). """
+        buf = bytearray()
+        self.encode(buf)
+        return bytes(buf)
@@ -0,0 +1,37 @@
+class ChainView:
+
+    def __init__(self, chain, block_hash):
+        """ A read-only view of the UTXO state at the end of a chain.
+
+        The chain is walked once, into a set of its block hashes; each lookup then checks the
+        blocks containing a transaction (or spending an output) against that set. Blockchain.get_utxo_view
+        keeps the last view built, so that walk is paid once per tip.
+
+        Args:
+            chain (:obj:`Blockchain`): Blockchain holding the indexes to query.
+            block_hash (str): Block hash of highest block in the viewed chain (None for the empty chain).
+
+        Attributes:
+            block_hash (str): Block hash of highest block in the viewed chain.
+            block_hashes (:obj:`set` of str): Hashes of every block on the viewed chain.
+        """
+        self.chain = chain
+        self.block_hash = block_hash
+        self.block_hashes = set(chain.get_chain_ending_with(block_hash))
+
+    def is_on_chain(self, block_hashes):
+        """ Returns True iff any of the given blocks is on the viewed chain. """
+        return not self.block_hashes.isdisjoint(block_hashes)
+
+    def is_unspent(self, input_ref):
+        """ Returns True iff the output referenced by input_ref exists and is unspent in this view. """
+        in_tx_hash, in_output_idx = input_ref.split(":")
+        if not self.has_transaction(in_tx_hash):
+            return False
+        if int(in_output_idx) >= len(self.chain.all_transactions[in_tx_hash].outputs):
+            return False
+        return not self.is_on_chain(self.chain.blocks_spending_input.get(input_ref, []))
+
+    def has_transaction(self, tx_hash):
+        """ Returns True iff the transaction with hash tx_hash is included in a block in this view. """
+        return self.is_on_chain(self.chain.blocks_containing_tx.get(tx_hash, []))
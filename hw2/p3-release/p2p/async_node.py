@@ -0,0 +1,150 @@
+import asyncio
+import concurrent.futures
+import config
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector
+from p2p import gossip
+
+#: Maximum number of connections posting messages to one peer at once; further messages wait in the peer's queue
+MAX_CONNECTIONS_PER_PEER = 16
+
+#: Maximum number of received messages waiting to be handled; further requests wait (HTTP backpressure)
+INBOX_SIZE = 10000
+
+class AsyncNode:
+
+    def __init__(self, port, host="127.0.0.1"):
+        """ P2P runtime of a node on an asyncio event loop, replacing Flask's /p2pmessage route and
+        gossip's sender threads: thousands of messages can be in flight in both directions, each
+        costing a coroutine rather than a thread.
+
+        Received messages go through a bounded inbox to a dispatcher task, which hands them to
+        gossip.handle_message one at a time on a single worker thread (handlers decode blocks and
+        may wait for room in the chain service's queue, so they must not block the loop).
+        While the node runs, gossip.send_message queues posts on the loop and returns at once; as in
+        gossip's threaded senders, each peer has a queue of gossip.PEER_QUEUE_SIZE messages, and
+        messages to a peer that far behind are dropped, so a slow peer cannot grow memory without bound.
+
+        Args:
+            port (int): Port to receive P2P messages on.
+            host (str, optional): Address to listen on (defaults to localhost).
+
+        Attributes:
+            loop (:obj:`AbstractEventLoop`): The event loop the node runs on (None until started).
+            session (:obj:`ClientSession`): Keep-alive HTTP client used for all outgoing messages.
+            inbox (:obj:`asyncio.Queue` of (str, str or bytes, str)): Received (type, message, sender) waiting to be handled.
+            peer_queues (:obj:`dict` of (str to :obj:`asyncio.Queue`)): Maps destinations to their (type, message) waiting to be posted.
+            peer_senders (:obj:`dict` of (str to int)): Maps destinations to the number of tasks posting their queued messages.
+            pending_sends (:obj:`set` of :obj:`asyncio.Task`): Tasks still posting queued messages.
+        """
+        self.port = port
+        self.host = host
+        self.loop = None
+        self.session = None
+        self.inbox = None
+        self.runner = None
+        self.dispatcher = None
+        self.peer_queues = {}
+        self.peer_senders = {}
+        self.pending_sends = set()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def start(self):
+        """ Starts receiving, dispatching and sending messages on the running event loop. """
+        self.loop = asyncio.get_running_loop()
+        self.inbox = asyncio.Queue(INBOX_SIZE)
+        self.session = ClientSession(connector=TCPConnector(limit=0, limit_per_host=MAX_CONNECTIONS_PER_PEER),
+            timeout=ClientTimeout(total=2))
+        app = web.Application()
+        app.router.add_post("/p2pmessage/{type}/{reply_port:\\d+}", self.receive)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.dispatcher = self.loop.create_task(self.dispatch())
+        gossip.message_sender = self.send
+
+    async def stop(self):
+        """ Stops the node, waiting for messages still being posted. """
+        gossip.message_sender = None
+        self.dispatcher.cancel()
+        if self.pending_sends:
+            await asyncio.wait(self.pending_sends)
+        await self.session.close()
+        await self.runner.cleanup()
+        self.executor.shutdown()
+
+    async def serve_forever(self):
+        """ Starts the node and runs it until cancelled (eg by Ctrl-C under asyncio.run). """
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+    async def receive(self, request):
+        """ Handles POST /p2pmessage/<type>/<reply_port>: queues the message for the dispatcher. """
+        type = request.match_info["type"]
+        body = await request.read()
+        if type in gossip.BINARY_MESSAGE_TYPES:
+            message = body
+        else:
+            message = body.decode("utf8")
+        sender = "http://" + str(request.remote) + ":" + request.match_info["reply_port"] + "/"
+        await self.inbox.put((type, message, sender))
+        return web.Response(text="Yay!")
+
+    async def dispatch(self):
+        """ Dispatcher task; hands received messages to gossip.handle_message in arrival order. """
+        while True:
+            type, message, sender = await self.inbox.get()
+            try:
+                await self.loop.run_in_executor(self.executor, gossip.handle_message, type, message, sender)
+            except Exception as e:
+                print("[p2p error] Failed to handle", type, "message from", sender)
+                print(e)
+
+    def send(self, dest, type, message):
+        """ Queues a message to be posted to a destination and returns immediately; safe to call from any thread.
+
+        Args:
+            dest (str): IP address of receiver.
+            type (str): Type of message to process as; unknown types are ignored.
+            message (str or bytes): Payload to deliver to destination to be processed based on type.
+        """
+        self.loop.call_soon_threadsafe(self.enqueue, dest, type, message)
+
+    def enqueue(self, dest, type, message):
+        """ Adds a message to its destination's queue on the loop (see send), dropping it if the queue is full,
+        and starts another task posting the queue unless MAX_CONNECTIONS_PER_PEER already do.
+        """
+        if dest not in self.peer_queues:
+            self.peer_queues[dest] = asyncio.Queue(gossip.PEER_QUEUE_SIZE)
+            self.peer_senders[dest] = 0
+        try:
+            self.peer_queues[dest].put_nowait((type, message))
+        except asyncio.QueueFull:
+            print("[p2p error] Send queue to", dest, "is full; message dropped")
+            return
+        if self.peer_senders[dest] < MAX_CONNECTIONS_PER_PEER:
+            self.peer_senders[dest] += 1
+            task = self.loop.create_task(self.drain(dest))
+            self.pending_sends.add(task)
+            task.add_done_callback(self.pending_sends.discard)
+
+    async def drain(self, dest):
+        """ Sender task; posts a destination's queued messages until its queue is empty. """
+        queue = self.peer_queues[dest]
+        try:
+            while not queue.empty():
+                type, message = queue.get_nowait()
+                await self.post(dest, type, message)
+        finally:
+            self.peer_senders[dest] -= 1
+
+    async def post(self, dest, type, message):
+        """ Posts a message to a destination's /p2pmessage route over the shared session. """
+        try:
+            async with self.session.post(dest + "p2pmessage/" + type + "/" + str(config.receiving_port), data=message) as response:
+                print(await response.text())
+        except Exception as e:
+            print("[p2p error] Message failed to send to", dest)
+            print(e)
@@ -1,6 +1,7 @@
 from blockchain.pow_block import PoWBlock
 from p2p.interfaces import transaction as tx_interface
 from blockchain.util import remove_empties
+from blockchain.encoding import Reader, FORMAT_VERSION, MAX_TARGET_VARINT_BYTES
 
 def string_to_block(blockstring, blockclass=PoWBlock):
     """ Takes a string as input and deserializes it into a
@@ -42,3 +43,73 @@ def string_to_block(blockstring, blockclass=PoWBlock):
         block = False
     print("[p2p] Blockhash imported", block.hash)
     return block
+
+def read_block_header(reader, blockclass=PoWBlock):
+    """ Decodes the header of a binary-encoded block (see Block.encode) into a block without
+        its transactions; the hash is already correct, since the header commits to the Merkle
+        root, so a block can be recognized before its transactions are decoded.
+
+        Args:
+            reader (:obj:`Reader`): Reader positioned at the start of the block.
+            blockclass (:obj:`Block`, optional): Class to use to parse the block.
+            Default is PoW block.
+
+        Returns:
+            Block object of type blockclass with no transactions; raises ValueError on malformed data.
+    """
+    if reader.read_varint() != FORMAT_VERSION:
+        raise ValueError("unknown block format")
+    flags = reader.read_varint()
+    height = reader.read_varint()
+    if flags & 2:
+        timestamp = reader.read_float()
+    else:
+        timestamp = reader.read_signed_varint()
+    target = reader.read_varint(MAX_TARGET_VARINT_BYTES)
+    parent_hash = reader.read_hash()
+    merkle = reader.read_hash()
+    if flags & 4:
+        seal_data = reader.read_str()
+    else:
+        seal_data = reader.read_varint()
+    return blockclass(height, [], parent_hash, is_genesis=bool(flags & 1), timestamp=timestamp,
+        target=target, merkle=merkle, seal_data=seal_data)
+
+def read_block_transactions(reader, block):
+    """ Decodes the transactions following a block header (see read_block_header) into the block.
+
+        Args:
+            reader (:obj:`Reader`): Reader positioned right after the block header.
+            block (:obj:`Block`): Block returned by read_block_header.
+
+        Returns:
+            The block, with its transactions; raises ValueError on malformed or trailing data.
+    """
+    block.transactions = [tx_interface.read_transaction(reader) for i in range(reader.read_varint())]
+    if not reader.at_end():
+        raise ValueError("trailing data")
+    return block
+
+def bytes_to_block(blockbytes, blockclass=PoWBlock):
+    """ Takes binary data as input and deserializes it into a
+        block object for receipt over network (see Block.to_bytes).
+
+        Fields are decoded straight out of a memoryview over the data; unlike
+        string_to_block, no intermediate strings are split out, and usernames
+        may contain any character.
+
+        Args:
+            blockbytes (bytes-like): Binary encoding of the block.
+            blockclass (:obj:`Block`, optional): Class to use to parse the block.
+            Default is PoW block.
+
+        Returns:
+            Block object of type blockclass, False on failure.
+    """
+    reader = Reader(blockbytes)
+    try:
+        block = read_block_transactions(reader, read_block_header(reader, blockclass))
+    except (ValueError, UnicodeDecodeError):
+        return False
+    print("[p2p] Blockhash imported", block.hash)
+    return block
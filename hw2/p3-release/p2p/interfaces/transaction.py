@@ -1,8 +1,9 @@
 from blockchain.transaction import Transaction
 from blockchain.util import remove_empties
+from blockchain.encoding import Reader
 from p2p.interfaces import transaction_output as txout_interface
 
-def string_to_transaction(txstring):
+def string_to_transaction(txstring, trusted=True):
     """ Takes a string as input and deserializes it into a
         transaction object for receipt over network.
         !!! WARNING !!!
@@ -10,12 +11,14 @@ def string_to_transaction(txstring):
 
         Args:
             txstring (str): String representing a cryptocurrency transaction.
+            trusted (bool, optional): Take the hash in the string instead of recomputing it; it is
+                checked once, when a block including the transaction is validated (see Transaction.hash_is_valid).
 
         Returns:
             :obj:`Transaction`: Parsed transaction object representing input,
             False or exception thrown on failure.
     """
-    transaction_parts = txstring.split("-")[1:]
+    claimed_hash, *transaction_parts = txstring.split("-")
     if len(transaction_parts) != 2:
         return False
     input_refs_str = transaction_parts[0]
@@ -26,4 +29,40 @@ def string_to_transaction(txstring):
     if False in outputs:
         return False
 
-    return Transaction(input_refs, outputs)
+    return Transaction(input_refs, outputs, claimed_hash=claimed_hash if trusted else None)
+
+def read_transaction(reader, trusted=True):
+    """ Decodes a transaction from its binary wire encoding (see Transaction.encode).
+
+        Args:
+            reader (:obj:`Reader`): Reader positioned at the start of the transaction.
+            trusted (bool, optional): Take the encoded hash instead of recomputing it; it is
+                checked once, when a block including the transaction is validated (see Transaction.hash_is_valid).
+
+        Returns:
+            :obj:`Transaction`: Parsed transaction; raises ValueError on malformed data.
+    """
+    claimed_hash = reader.read_hash()
+    input_refs = [reader.read_input_ref() for i in range(reader.read_varint())]
+    outputs = [txout_interface.read_output(reader) for i in range(reader.read_varint())]
+    return Transaction(input_refs, outputs, claimed_hash=claimed_hash if trusted else None)
+
+def bytes_to_transaction(txbytes, trusted=True):
+    """ Takes binary data as input and deserializes it into a
+        transaction object for receipt over network.
+
+        Args:
+            txbytes (bytes-like): Binary encoding of a transaction (see Transaction.to_bytes).
+            trusted (bool, optional): Take the encoded hash instead of recomputing it (see read_transaction).
+
+        Returns:
+            :obj:`Transaction`: Parsed transaction object, False on failure.
+    """
+    reader = Reader(txbytes)
+    try:
+        tx = read_transaction(reader, trusted)
+    except (ValueError, UnicodeDecodeError):
+        return False
+    if not reader.at_end():
+        return False
+    return tx
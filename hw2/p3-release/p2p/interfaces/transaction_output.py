@@ -19,3 +19,16 @@ def string_to_output(outputstring):
         return False
 
     return TransactionOutput(output_parts[0], output_parts[1], int(output_parts[2]))
+
+def read_output(reader):
+    """ Decodes a transaction output from its binary wire encoding (see TransactionOutput.encode).
+
+        Args:
+            reader (:obj:`Reader`): Reader positioned at the start of the output.
+
+        Returns:
+            :obj:`TransactionOutput`: Parsed transaction output; raises ValueError on malformed data.
+    """
+    sender = reader.read_str()
+    receiver = reader.read_str()
+    return TransactionOutput(sender, receiver, reader.read_signed_varint())
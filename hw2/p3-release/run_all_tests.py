@@ -1,5 +1,7 @@
 import unittest
 from tests.gossip import GossipTest
+from tests.wire import WireTest
+from tests.async_node import AsyncNodeTest
 # from tests.synchrony_start import SynchronyStartTest
 # from tests.synchrony_rounds import SynchronyRoundsTest
 # from tests.synchrony_sends import SynchronySendsTest
@@ -11,6 +13,14 @@ from tests.gossip import GossipTest
 suite = unittest.TestLoader().loadTestsFromTestCase(GossipTest)
 unittest.TextTestRunner(verbosity=2).run(suite)
 
+# Test for binary block encoding - bytes_to_block
+suite = unittest.TestLoader().loadTestsFromTestCase(WireTest)
+unittest.TextTestRunner(verbosity=2).run(suite)
+
+# Test for asyncio node runtime - AsyncNode
+suite = unittest.TestLoader().loadTestsFromTestCase(AsyncNodeTest)
+unittest.TextTestRunner(verbosity=2).run(suite)
+
 # Test for (1.1) - synchrony_start
 # suite = unittest.TestLoader().loadTestsFromTestCase(SynchronyStartTest)
 # unittest.TextTestRunner(verbosity=2).run(suite)
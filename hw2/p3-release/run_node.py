@@ -7,7 +7,7 @@ if __name__ == '__main__':
     try:
         int(sys.argv[1])
     except:
-        print("Usage: python3 run_node.py [node id, 1-6]")
+        print("Usage: python3 run_node.py [node id, 1-6] [--async]")
         exit(1)
 
     node_id = int(sys.argv[1].strip())
@@ -21,4 +21,12 @@ if __name__ == '__main__':
         del config.PEERS[node_id]
 
     from webapp.app import app
-    app.run(port=config.receiving_port, debug=True)
+    if "--async" in sys.argv[2:]:
+        # P2P messages on an asyncio event loop; the explorer moves to a thread on port 5100 + node id
+        import asyncio
+        import threading
+        from p2p.async_node import AsyncNode
+        threading.Thread(target=app.run, kwargs={"port": config.receiving_port + 100, "threaded": True}, daemon=True).start()
+        asyncio.run(AsyncNode(config.receiving_port).serve_forever())
+    else:
+        app.run(port=config.receiving_port, debug=True)
@@ -0,0 +1,93 @@
+
+import sys
+import os
+# getting the name of the directory
+# where the this file is present.
+current = os.path.dirname(os.path.realpath(__file__))
+  
+# Getting the parent directory name
+# where the current directory is present.
+parent = os.path.dirname(current)
+  
+# adding the parent directory to 
+# the sys.path.
+sys.path.append(parent)
+
+
+import unittest
+import asyncio
+import socket
+from p2p import gossip
+from p2p.async_node import AsyncNode
+
+real_send_message = gossip.send_message # tests.gossip replaces it
+
+class AsyncNodeTest(unittest.TestCase):
+
+    handled = []
+
+    def handle_message(type, message, sender):
+        AsyncNodeTest.handled.append((type, message))
+
+    def test_async_loopback(self):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        dest = "http://127.0.0.1:" + str(port) + "/"
+        old_handle_message = gossip.handle_message
+        gossip.handle_message = AsyncNodeTest.handle_message
+
+        async def run():
+            node = AsyncNode(port)
+            await node.start()
+            try:
+                # gossip's send_message goes through the node while it runs, and never blocks
+                for i in range(200):
+                    real_send_message(dest, "whee", "test" + str(i))
+                real_send_message(dest, "addblock", b"\x00\xff")
+                for i in range(100):
+                    if len(AsyncNodeTest.handled) == 201:
+                        break
+                    await asyncio.sleep(.05)
+            finally:
+                await node.stop()
+            self.assertEqual(gossip.message_sender, None)
+
+        try:
+            asyncio.run(run())
+        finally:
+            gossip.handle_message = old_handle_message
+        self.assertEqual(len(AsyncNodeTest.handled), 201)
+        self.assertEqual(set(AsyncNodeTest.handled), set([("whee", "test" + str(i)) for i in range(200)] + [("addblock", b"\x00\xff")]))
+
+    def test_async_send_queue_bound(self):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            dest = "http://127.0.0.1:" + str(probe.getsockname()[1]) + "/" # nobody listening
+        old_queue_size = gossip.PEER_QUEUE_SIZE
+        gossip.PEER_QUEUE_SIZE = 4
+
+        async def run():
+            node = AsyncNode(port)
+            await node.start()
+            try:
+                # queued without yielding to the loop, so no message was posted yet
+                for i in range(10):
+                    node.enqueue(dest, "whee", "test" + str(i))
+                self.assertEqual(node.peer_queues[dest].qsize(), 4) # the rest were dropped
+                self.assertEqual(node.peer_senders[dest], 4)
+            finally:
+                await node.stop()
+            self.assertTrue(node.peer_queues[dest].empty())
+            self.assertEqual(node.peer_senders[dest], 0)
+
+        try:
+            asyncio.run(run())
+        finally:
+            gossip.PEER_QUEUE_SIZE = old_queue_size
+
+if __name__ == '__main__':
+    unittest.main()
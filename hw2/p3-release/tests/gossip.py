@@ -15,7 +15,64 @@ sys.path.append(parent)
 
 
 import unittest
+import types
+import contextlib
+import time
+import ZODB
+import transaction
+import persistent
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import blockchain
 from p2p import gossip
+from blockchain.pow_block import PoWBlock
+from blockchain.transaction import Transaction, TransactionOutput
+from blockchain.chain_service import ChainService
+from blockchain.orphans import OrphanPool
+
+real_send_message = gossip.send_message # test_gossip replaces it
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    """ Peer stub recording every p2p message it receives """
+
+    protocol_version = "HTTP/1.1" # keep-alive, like a Flask node
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        RecordingHandler.received.append((self.path, body, self.client_address[1]))
+        self.send_response(200)
+        self.send_header("Content-Length", "4")
+        self.end_headers()
+        self.wfile.write(b"Yay!")
+
+    def log_message(self, *args):
+        pass
+
+class TestChain:
+    """ In-memory stand-in for the node's chaindb.chain """
+
+    def __init__(self):
+        self.blocks = {}
+
+    def add_block(self, block, save=True):
+        if block.hash in self.blocks:
+            return False
+        if block.seal_data == -1:
+            raise ValueError("broken block")
+        self.blocks[block.hash] = block
+        return True
+
+    def get_verdict(self, block_hash):
+        return (True, "All checks passed") if block_hash in self.blocks else None
+
+class PersistentTestChain(TestChain, persistent.Persistent):
+    """ TestChain stored in a database """
+
+    def add_block(self, block, save=True):
+        added = super().add_block(block)
+        self._p_changed = True
+        return added
 
 class GossipTest(unittest.TestCase):
 
@@ -24,6 +81,12 @@ class GossipTest(unittest.TestCase):
     def send_message(to, type, message):
         GossipTest.messages_sent.add((to, type, message))
 
+    def setUp(self):
+        self.old_node_id = gossip.config.node_id # tests gossip as different nodes
+
+    def tearDown(self):
+        gossip.config.node_id = self.old_node_id # restore original node id
+
     def test_gossip(self):
         # test that universal gossip works with all nodes
         gossip.send_message = GossipTest.send_message
@@ -42,6 +105,187 @@ class GossipTest(unittest.TestCase):
         expected_output = set([('http://127.0.0.1:5001/', 'whee', 'test'), ('http://127.0.0.1:5002/', 'whee', 'test'), ('http://127.0.0.1:5003/', 'whee', 'test'), ('http://127.0.0.1:5004/', 'whee', 'test'), ('http://127.0.0.1:5005/', 'whee', 'test')])
         self.assertEqual(GossipTest.messages_sent, expected_output)
 
+    def test_peer_queues(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RecordingHandler) # daemon handler threads, so shutdown ignores the open connection
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        dest = "http://127.0.0.1:" + str(server.server_port) + "/"
+        try:
+            for i in range(5):
+                real_send_message(dest, "whee", "test" + str(i))
+            real_send_message(dest, "addblock", b"\x00\xff")
+            self.assertTrue(gossip.flush_messages(10))
+        finally:
+            server.shutdown()
+            server.server_close()
+        # delivered in order, over a single connection
+        self.assertEqual([body for path, body, port in RecordingHandler.received], [b"test0", b"test1", b"test2", b"test3", b"test4", b"\x00\xff"])
+        self.assertEqual(RecordingHandler.received[-1][0], "/p2pmessage/addblock/" + str(gossip.config.receiving_port))
+        self.assertEqual(len(set(port for path, body, port in RecordingHandler.received)), 1)
+
+    def test_inventory_gossip(self):
+        sent = []
+        old_send_message = gossip.send_message
+        old_chaindb = getattr(blockchain, "chaindb", None)
+        gossip.send_message = lambda to, type, message: sent.append((to, type, message))
+        chain = TestChain()
+        service = ChainService(chain)
+        blockchain.chaindb = types.SimpleNamespace(chain=chain, get_service=lambda: service, read_chain=lambda: contextlib.nullcontext(chain)) # handle_message does "from blockchain import chaindb"
+        gossip.config.node_id = 6
+        try:
+            tx = Transaction([], [TransactionOutput("Alice", "Bob", 1)])
+            block = PoWBlock(0, [tx], "genesis", is_genesis=True, target=2 ** 256)
+            peer1 = "http://127.0.0.1:5001/"
+            peer2 = "http://127.0.0.1:5002/"
+
+            # announced blocks are fetched from one peer only
+            gossip.handle_message("inv", block.hash, peer1)
+            gossip.handle_message("inv", block.hash, peer2)
+            self.assertEqual(sent, [(peer1, "getdata", block.hash)])
+            sent.clear()
+            # if peer1 doesn't answer in time, peer2 is asked next
+            self.assertEqual(gossip.block_requests.expire(now=time.time() + gossip.GETDATA_TIMEOUT), [(block.hash, peer2)])
+
+            # a new block is added and announced (by hash) to every peer, but only once
+            gossip.handle_message("addblock", block.to_bytes(), peer1)
+            self.assertTrue(service.wait(5))
+            self.assertIn(block.hash, blockchain.chaindb.chain.blocks)
+            self.assertEqual(set(type for to, type, message in sent), set(["inv"]))
+            self.assertEqual(len(sent), 5)
+            sent.clear()
+            gossip.handle_message("addblock", block.to_bytes()[:-1], peer2) # known hash: dropped before decoding the body
+            gossip.handle_message("inv", block.hash, peer2)
+            self.assertEqual(sent, [])
+
+            # peers fetching an announced block get it in full
+            gossip.handle_message("getdata", block.hash, peer2)
+            gossip.handle_message("getdata", "f" * 64, peer2)
+            self.assertEqual(sent, [(peer2, "addblock", block.to_bytes())])
+            sent.clear()
+
+            # an orphan's missing parent is fetched from the peer that sent it
+            parent = PoWBlock(1, [], block.hash, target=2 ** 256)
+            child = PoWBlock(2, [], parent.hash, target=2 ** 256)
+            gossip.handle_message("addblock", child.to_bytes(), peer2)
+            self.assertTrue(service.wait(5))
+            self.assertEqual(sent, [(peer2, "getdata", parent.hash)])
+            sent.clear()
+            gossip.handle_message("addblock", parent.to_bytes(), peer2)
+            self.assertTrue(service.wait(5))
+            self.assertIn(child.hash, chain.blocks)
+            self.assertNotIn(parent.hash, gossip.block_requests)
+        finally:
+            gossip.send_message = old_send_message
+            blockchain.chaindb = old_chaindb
+
+    def test_chain_service(self):
+        chain = TestChain()
+        service = ChainService(chain, queue_size=4)
+        handled = []
+        blocks = [PoWBlock(0, [], "genesis", is_genesis=True, target=2 ** 256)]
+        for height in range(1, 6):
+            blocks.append(PoWBlock(height, [], blocks[-1].hash, target=2 ** 256))
+        broken = PoWBlock(1, [], blocks[0].hash, target=2 ** 256)
+        broken.set_seal_data(-1)
+
+        # blocks are added in submission order on one worker; a block raising is rejected without stopping it
+        for block in blocks[:3] + [broken, blocks[0]] + blocks[3:]:
+            self.assertTrue(service.submit(block, lambda block, added: handled.append((block.hash, added))))
+        self.assertTrue(service.wait(5))
+        self.assertEqual(handled, [(block.hash, True) for block in blocks[:3]] + [(broken.hash, False), (blocks[0].hash, False)] + [(block.hash, True) for block in blocks[3:]])
+        self.assertEqual(list(chain.blocks), [block.hash for block in blocks])
+        self.assertTrue(service.thread.is_alive())
+
+    def test_chain_service_commits(self):
+        db = ZODB.DB(None) # in-memory storage
+        connection = db.open() # bound to this thread's transaction manager, as chaindb's connection is
+        try:
+            connection.root.chain = PersistentTestChain()
+            transaction.commit()
+            service = ChainService(connection.root.chain, transaction_manager=connection.transaction_manager)
+            block = PoWBlock(0, [], "genesis", is_genesis=True, target=2 ** 256)
+            self.assertTrue(service.submit(block))
+            self.assertTrue(service.wait(5))
+
+            # the worker's commit is visible to readers on other connections
+            reader = db.open(transaction_manager=transaction.TransactionManager())
+            try:
+                reader.sync()
+                self.assertIn(block.hash, reader.root.chain.blocks)
+            finally:
+                reader.close()
+        finally:
+            transaction.abort()
+            connection.close()
+            db.close()
+
+    def test_orphan_blocks(self):
+        chain = TestChain()
+        service = ChainService(chain)
+        handled = []
+        on_done = lambda block, added: handled.append((block.hash, added))
+        blocks = [PoWBlock(0, [], "genesis", is_genesis=True, target=2 ** 256)]
+        for height in range(1, 5):
+            blocks.append(PoWBlock(height, [], blocks[-1].hash, target=2 ** 256))
+        fork = PoWBlock(2, [], blocks[1].hash, target=2 ** 256)
+        fork.set_seal_data(5)
+
+        # children arriving before their parents wait, then connect in a cascade
+        for block in [blocks[4], blocks[2], fork, blocks[3], blocks[1]]:
+            service.submit(block, on_done)
+        self.assertTrue(service.wait(5))
+        self.assertEqual(handled, [])
+        self.assertEqual(len(service.orphans), 5)
+        service.submit(blocks[0], on_done)
+        self.assertTrue(service.wait(5))
+        self.assertEqual(handled, [(block.hash, True) for block in blocks[:3] + [fork] + blocks[3:]])
+        self.assertEqual(len(service.orphans), 0)
+        self.assertEqual(service.orphans.children, {})
+
+    def test_orphan_pool_eviction(self):
+        pool = OrphanPool(max_size=2, max_age=10)
+        parent = PoWBlock(0, [], "genesis", is_genesis=True, target=2 ** 256)
+        children = []
+        for seal_data in range(3):
+            children.append(PoWBlock(1, [], parent.hash, target=2 ** 256))
+            children[-1].set_seal_data(seal_data)
+        self.assertEqual(pool.add(children[0], "a", now=0), [])
+        self.assertEqual(pool.add(children[1], "b", now=5), [])
+        self.assertEqual(pool.add(children[2], "c", now=6), [(children[0], "a")]) # over size: oldest goes
+        self.assertEqual(pool.expire(now=15.5), [(children[1], "b")]) # too old
+        self.assertNotIn(children[1].hash, pool)
+        self.assertEqual(pool.pop_children(parent.hash), [(children[2], "c")])
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(pool.children, {})
+
+    def test_block_requests(self):
+        requests = gossip.BlockRequests(2, timeout=5)
+        self.assertTrue(requests.announce("a", "peer1", now=0))
+        self.assertFalse(requests.announce("a", "peer2", now=1))
+        self.assertFalse(requests.announce("a", "peer2", now=2)) # each peer waits in line once
+        self.assertFalse(requests.announce("a", "peer3", now=2))
+        self.assertEqual(requests.expire(now=4), [])
+        self.assertEqual(requests.expire(now=5), [("a", "peer2")]) # peer1 didn't answer in time
+        self.assertEqual(requests.expire(now=10), [("a", "peer3")])
+        self.assertEqual(requests.expire(now=15), [])
+        self.assertNotIn("a", requests) # nobody left to ask
+        self.assertTrue(requests.announce("a", "peer1", now=15))
+        self.assertTrue(requests.announce("b", "peer1", now=15))
+        self.assertTrue(requests.announce("c", "peer1", now=15)) # over capacity: oldest goes
+        self.assertNotIn("a", requests)
+        requests.received("b")
+        self.assertNotIn("b", requests)
+
+    def test_lru_cache(self):
+        cache = gossip.LRUCache(2)
+        cache.put("a")
+        cache.put("b")
+        self.assertIn("a", cache) # a is now more recently used than b
+        cache.put("c")
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.get("a"), True)
+        self.assertEqual(cache.pop("c"), True)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,87 @@
+
+import sys
+import os
+# getting the name of the directory
+# where the this file is present.
+current = os.path.dirname(os.path.realpath(__file__))
+  
+# Getting the parent directory name
+# where the current directory is present.
+parent = os.path.dirname(current)
+  
+# adding the parent directory to 
+# the sys.path.
+sys.path.append(parent)
+
+
+import unittest
+from blockchain.pow_block import PoWBlock
+from blockchain.transaction import Transaction, TransactionOutput
+from p2p.interfaces.block import bytes_to_block
+from p2p.interfaces.transaction import bytes_to_transaction
+from blockchain.encoding import FORMAT_VERSION, Reader
+
+class WireTest(unittest.TestCase):
+
+    def test_block_round_trip(self):
+        # usernames with the old string format's separators, negative and huge amounts
+        tx1 = Transaction([], [TransactionOutput("Al`i!c-e;~", "Bob", 100), TransactionOutput("Alice", "Alice", -3)])
+        tx2 = Transaction([tx1.hash + ":1", "not:a:ref"], [TransactionOutput("Alice", "Bob", 2 ** 62)])
+        block = PoWBlock(0, [tx1, tx2], "genesis", is_genesis=True, target=2 ** 256)
+        block.set_seal_data(123456)
+        encoded = block.to_bytes()
+        self.assertLess(len(encoded), len(str(block)))
+
+        decoded = bytes_to_block(encoded)
+        self.assertEqual(decoded.hash, block.hash)
+        self.assertEqual(decoded.seal_data, 123456)
+        self.assertEqual([tx.hash for tx in decoded.transactions], [tx1.hash, tx2.hash])
+        self.assertEqual(decoded.transactions[0].outputs[0].sender, "Al`i!c-e;~")
+        self.assertEqual(bytes_to_transaction(tx2.to_bytes()).input_refs, tx2.input_refs)
+
+        # integer timestamps and non-integer seals keep their exact header representation
+        child = PoWBlock(1, [tx2], block.hash, timestamp=17, target=5, seal_data="0042")
+        self.assertEqual(bytes_to_block(bytearray(child.to_bytes())).hash, child.hash)
+
+    def test_trusted_transaction_hashes(self):
+        tx = Transaction([], [TransactionOutput("Alice", "Bob", 1)])
+        # the decoder takes the sender's hash; it is checked (once) when a block is validated
+        decoded = bytes_to_transaction(tx.to_bytes())
+        self.assertEqual(decoded.hash, tx.hash)
+        self.assertEqual(decoded._v_hash_valid, None)
+        self.assertTrue(decoded.hash_is_valid())
+        self.assertTrue(bytes_to_transaction(tx.to_bytes(), trusted=False)._v_hash_valid)
+
+        forged = bytearray(tx.to_bytes())
+        forged[1] ^= 1 # flip a bit of the claimed hash
+        self.assertFalse(bytes_to_transaction(forged).hash_is_valid())
+
+    def test_malformed_block(self):
+        encoded = PoWBlock(0, [], "genesis", is_genesis=True, target=5).to_bytes()
+        self.assertFalse(bytes_to_block(encoded[:-1]))
+        self.assertFalse(bytes_to_block(encoded + b"\x00"))
+        self.assertFalse(bytes_to_block(bytes([FORMAT_VERSION + 1]) + encoded[1:]))
+
+    def test_varint_length_limit(self):
+        self.assertEqual(Reader(b"\xff" * 9 + b"\x01").read_varint(), 2 ** 64 - 1)
+        with self.assertRaises(ValueError):
+            Reader(b"\x80" * 10 + b"\x01").read_varint()
+        # amounts are bounded to 64 bits on both sides of the wire, and by transaction validation
+        for amount in [-2 ** 63, 2 ** 63 - 1]:
+            tx = Transaction(["a:0"], [TransactionOutput("Alice", "Bob", amount)])
+            self.assertTrue(tx.is_valid())
+            self.assertEqual(bytes_to_transaction(tx.to_bytes()).outputs[0].amount, amount)
+        tx = Transaction(["a:0"], [TransactionOutput("Alice", "Bob", 2 ** 63)])
+        self.assertFalse(tx.is_valid())
+        with self.assertRaises(ValueError):
+            tx.to_bytes()
+        with self.assertRaises(ValueError):
+            Reader(b"\x80" * 9 + b"\x02").read_signed_varint() # zigzag 2 ** 64, one bit too wide
+        # only a block's target may be wider than 64 bits
+        block = PoWBlock(0, [], "genesis", is_genesis=True, target=2 ** 256)
+        self.assertEqual(bytes_to_block(block.to_bytes()).hash, block.hash)
+        encoded = bytearray(PoWBlock(0, [], "genesis", is_genesis=True, target=5).to_bytes())
+        self.assertFalse(bytes_to_block(encoded[:2] + b"\x80" * 20 + encoded[2:]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,31 @@
 import config
-import ZODB, ZODB.FileStorage
-import transaction
-import importlib
-from flask import Flask, render_template, request
+from contextlib import contextmanager
+from flask import Flask, render_template, request, jsonify
+from blockchain.util import sha256_2_string
 from p2p import gossip
 import threading
 
+# serializes incoming p2p messages; received blocks are written by the chain service (chaindb.get_service())
 sem = threading.Semaphore()
 
 app = Flask(__name__)
 
+@contextmanager
+def open_chain():
+    """ Borrow a connection from the database's pool for the duration of one request (see chaindb.read_chain).
+
+    Each request gets its own connection and transaction manager, so explorer requests run
+    concurrently with each other and with p2p messages, and see the latest block committed by
+    the chain service; the objects a pooled connection already loaded (with their cached headers
+    and Merkle trees) are reused from its cache.
+
+    Yields:
+        (:obj:`Blockchain`): the blockchain as of the latest commit.
+    """
+    from blockchain import chaindb # imported on first use; opening the db at import would lock it in the reloader's parent process
+    with chaindb.read_chain() as chain:
+        yield chain
+
 def get_all_blockhashes(chain):
     block_hashes = []
     for height in chain.get_heights_with_blocks():
@@ -22,21 +38,11 @@ def get_best_chain_blockhashes(chain):
     return chain.get_chain_ending_with(chain.get_heaviest_chain_tip().hash)
 
 def render_chain(block_hashes_function):
-    sem.acquire()
-    from blockchain import chaindb
-    chaindb.connection.close()
-    chaindb.db.close()
-    importlib.reload(chaindb)
-    chain = chaindb.chain
-
-    block_hashes = block_hashes_function(chain)
-
-    weights=chain.get_all_block_weights()
-    output = render_template('chain.html', block_hashes=block_hashes, chain=chain, weights=weights)
-    chaindb.connection.close()
-    chaindb.db.close()
-    sem.release()
-    return output
+    with open_chain() as chain:
+        block_hashes = block_hashes_function(chain)
+
+        weights=chain.get_all_block_weights()
+        return render_template('chain.html', block_hashes=block_hashes, chain=chain, weights=weights)
 
 @app.route('/')
 def full_chain_view():
@@ -46,10 +52,50 @@ def full_chain_view():
 def best_chain_view():
     return render_chain(get_best_chain_blockhashes)
 
+def get_tx_proofs(chain, tx_hash):
+    """ Collect a Merkle inclusion proof of a transaction for every block containing it.
+
+    Args:
+        chain (:obj:`Blockchain`): Blockchain to look the transaction up in.
+        tx_hash (str): Hash of the transaction to prove.
+
+    Returns:
+        dict: JSON-serializable proofs (see verify_merkle_proof in blockchain.merkle), or None if the transaction is unknown.
+    """
+    if tx_hash not in chain.all_transactions:
+        return None
+    proofs = []
+    for block_hash in chain.blocks_containing_tx.get(tx_hash, []):
+        block = chain.blocks[block_hash]
+        tx_index = [tx.hash for tx in block.transactions].index(tx_hash)
+        proofs.append({
+            "block_hash": block_hash,
+            "height": block.height,
+            "merkle_root": block.merkle,
+            "tx_index": tx_index,
+            "proof": block.get_merkle_proof(tx_index),
+        })
+    return {
+        "tx_hash": tx_hash,
+        "leaf_hash": sha256_2_string(str(chain.all_transactions[tx_hash])),
+        "proofs": proofs,
+    }
+
+@app.route('/proof/<string:tx_hash>')
+def proof_view(tx_hash):
+    with open_chain() as chain:
+        proofs = get_tx_proofs(chain, tx_hash)
+    if proofs is None:
+        return jsonify({"error": "Unknown transaction"}), 404
+    return jsonify(proofs)
+
 # Expose gossip interface in addition to web interface
 @app.route('/p2pmessage/<string:type>/<int:reply_port>', methods=['POST'])
 def route_message(type, reply_port):
-    message = str(request.data.decode("utf8"))
+    if type in gossip.BINARY_MESSAGE_TYPES:
+        message = request.get_data()
+    else:
+        message = str(request.data.decode("utf8"))
     sender = "http://" + str(request.remote_addr) + ":" + str(reply_port) + "/"
     sem.acquire()
     gossip.handle_message(type, message, sender)